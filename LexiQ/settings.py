@@ -43,14 +43,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "wordapp.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "wordapp.middleware.ProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    "wordapp.middleware.StaticFilesMiddleware",
 
 ]
 
@@ -58,7 +60,7 @@ ROOT_URLCONF = "LexiQ.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "wordapp.perf.TimedDjangoTemplates",
         "DIRS": [os.path.join(BASE_DIR, 'templates')],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -79,10 +81,40 @@ ASGI_APPLICATION = 'LexiQ.asgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# 自定义后端在 Django 的 SQLite 后端上增加 PRAGMA 配置和 SQLITE_BUSY 重试，见 LexiQ/sqlite_backend
+# daphne（ASGI）下 Django 不能在请求之间复用数据库连接，CONN_MAX_AGE 大于 0 只会留下不再使用
+# 也不会关闭的连接，所以保持 0，每个请求结束后关闭连接
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "LexiQ.sqlite_backend",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {
+            "pragmas": {
+                "busy_timeout": 5000,
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "mmap_size": 256 * 1024 * 1024,
+                "cache_size": -20000,
+            },
+            "transaction_mode": "IMMEDIATE",
+            "busy_retries": 5,
+            "busy_backoff": 0.05,
+        },
+    }
+}
+
+
+# Cache
+# 单词组的缓存按版本号失效，版本号由 run_worker 进程中的导入和删除任务更新，
+# 必须使用 web 和 worker 进程共享的缓存后端，不能用进程内的 LocMemCache
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache", "django"),
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
     }
 }
 
@@ -136,6 +168,44 @@ STATIC_ROOT = os.path.join(BASE_DIR,"cache" ,'static')
 # https://warehouse.python.org/project/whitenoise/
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# TTS 语音缓存
+TTS_CACHE_DIR = os.path.join(BASE_DIR, 'wordapp', 'tts')
+TTS_CACHE_MAX_ENTRIES = 5000
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024
+TTS_SYNTHESIZER = 'wordapp.tts_cache.EdgeTTSSynthesizer'
+TTS_VOICE = 'en-GB-SoniaNeural'
+
+# 学习记录延迟写入，开启后答题记录先进入缓冲区，由后台线程批量写入
+STUDY_RECORD_WRITE_BEHIND = False
+STUDY_RECORD_WRITE_BEHIND_MAX_LAG = 1.0  # 秒
+STUDY_RECORD_WRITE_BEHIND_BATCH_SIZE = 500
+STUDY_RECORD_WRITE_BEHIND_SPOOL = os.path.join(BASE_DIR, 'cache', 'spool')
+
+# 超过这个耗时（毫秒）的请求连同最慢的 SQL 记入日志，None 表示不记录
+PERF_SLOW_REQUEST_MS = 500
+
+# /metrics 除管理员外只允许这些地址访问，默认只允许管理员；
+# 经本机反向代理转发时所有请求的 REMOTE_ADDR 都是 127.0.0.1，不要把本机地址加进来
+METRICS_ALLOWED_IPS = []
+# 多个 worker 进程部署时设置为各进程共享的本地目录，抓取时汇总所有进程的指标
+METRICS_DIR = None
+METRICS_DUMP_INTERVAL = 10.0  # 秒
+
+# 性能剖析，开启后管理员可以用 ?profile=1 或 X-Profile 请求头剖析单个请求，见 wordapp/profiling.py
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.0  # 随机剖析的请求比例
+PROFILING_DIR = os.path.join(BASE_DIR, 'cache', 'profiles')
+PROFILING_MAX_FILES = 50
+
+# 后台任务（导入、删除单词组、预生成语音）由 manage.py run_worker 执行，见 wordapp/jobs.py
+JOBS_LEASE_SECONDS = 60  # 任务超过这个时间没有汇报进度，视为 worker 已退出，由其他 worker 接手
+JOBS_POLL_INTERVAL = 1.0  # 秒
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_BACKOFF = 5.0  # 第一次重试前等待的秒数，之后每次加倍
+JOBS_UPLOAD_DIR = os.path.join(BASE_DIR, 'cache', 'uploads')  # 等待导入的 CSV 文件
+# 分批删除单词组时每批之间等待的秒数，让答题请求有机会拿到写锁，见 wordapp/purge.py
+GROUP_PURGE_PAUSE = 0.01
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -166,5 +236,13 @@ LOGGING = {
             'handlers': ['file'],
             'level': 'DEBUG',
         },
+        'wordapp.perf': {
+            'handlers': ['file'],
+            'level': 'WARNING',
+        },
+        'wordapp.jobs': {
+            'handlers': ['file'],
+            'level': 'INFO',
+        },
     }
 }
@@ -0,0 +1,105 @@
+"""
+面向生产部署的 SQLite 数据库后端
+
+在 Django 自带后端的基础上：
+- 每个新连接执行 OPTIONS['pragmas'] 中的 PRAGMA（默认开启 WAL、busy_timeout 等）；
+- 自动提交模式下的语句遇到 SQLITE_BUSY 时按带抖动的指数退避重试，
+  事务内的语句不重试（应由调用方重试整个事务）；
+- OPTIONS['transaction_mode'] = 'IMMEDIATE' 时 atomic() 以 BEGIN IMMEDIATE 开始，
+  一开始就拿写锁，避免事务中途从读锁升级为写锁时直接报 database is locked。
+
+PRAGMA 在每个新连接上执行一次，开销很小，不依赖 CONN_MAX_AGE 复用连接。
+"""
+import random
+import re
+import sqlite3
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,  # 毫秒，放在最前面，切换 WAL 时也能等待锁
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # WAL 模式下 NORMAL 不会损坏数据库，只可能丢失最后几个事务
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,  # 负数表示 KiB，约 20MB
+}
+DEFAULT_BUSY_RETRIES = 5
+DEFAULT_BUSY_BACKOFF = 0.05
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+PRAGMA_NAME_RE = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+BUSY_CODES = (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+def is_busy_error(error):
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in BUSY_CODES  # 扩展错误码的低 8 位是主错误码
+    return 'locked' in str(error)
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    retries = DEFAULT_BUSY_RETRIES
+    backoff = DEFAULT_BUSY_BACKOFF
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        # executemany 可能收到生成器，重试前先转成列表
+        return self._retry(super().executemany, query, list(param_list))
+
+    def _retry(self, method, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return method(*args)
+            except sqlite3.OperationalError as e:
+                if attempt == self.retries or self.connection.in_transaction or not is_busy_error(e):
+                    raise
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    CUSTOM_OPTIONS = ('pragmas', 'transaction_mode', 'busy_retries', 'busy_backoff')
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        options = settings_dict.get('OPTIONS', {})
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        for name, value in self.pragmas.items():
+            if not PRAGMA_NAME_RE.match(name) or not PRAGMA_VALUE_RE.match(str(value)):
+                raise ImproperlyConfigured(f'Invalid SQLite pragma: {name} = {value!r}')
+        self.transaction_mode = options.get('transaction_mode')
+        if self.transaction_mode is not None:
+            self.transaction_mode = self.transaction_mode.upper()
+            if self.transaction_mode not in TRANSACTION_MODES:
+                raise ImproperlyConfigured(
+                    f'transaction_mode must be one of {", ".join(TRANSACTION_MODES)}')
+        self.busy_retries = options.get('busy_retries', DEFAULT_BUSY_RETRIES)
+        self.busy_backoff = options.get('busy_backoff', DEFAULT_BUSY_BACKOFF)
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for key in self.CUSTOM_OPTIONS:
+            kwargs.pop(key, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=RetryingCursorWrapper)
+        cursor.retries = self.busy_retries
+        cursor.backoff = self.busy_backoff
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
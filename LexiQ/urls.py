@@ -16,7 +16,8 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from wordapp.views import upload_csv, index, upload_csv, display_words, start_game, delete_word_group, game, tts, play_audio, register, login, view_study_records
+from wordapp.api import session_check, session_results, session_words
+from wordapp.views import upload_csv, index, upload_csv, display_words, group_words, export_group_words, export_study_records, search, start_game, delete_word_group, job_status, game, tts, tts_stats, metrics, play_audio, register, login, view_study_records, study_records_json, activity_heatmap
 
 
 urlpatterns = [
@@ -26,10 +27,22 @@ urlpatterns = [
     path('login/', login, name='login'),
     path('upload_csv/', upload_csv, name='upload_csv'),
     path('delete_word_group/', delete_word_group, name='delete_word_group'),
+    path('jobs/<int:job_id>/', job_status, name='job_status'),
     path('display_words/', display_words, name='display_words'),
+    path('display_words/<int:group_id>/', group_words, name='group_words'),
+    path('export/group/<int:group_id>/', export_group_words, name='export_group_words'),
+    path('export/study_records/', export_study_records, name='export_study_records'),
+    path('search/', search, name='search_words'),
     path('start_game/', start_game, name='start_game'),
     path('game/<int:group_id>/', game, name='game'),
     path('tts/<str:word>/', tts, name='tts'),
-    path('play-audio/<path:file_path>/', play_audio, name='play_audio'),
-    path('view_study_records/', view_study_records, name='view_study_records')
+    path('tts_stats/', tts_stats, name='tts_stats'),
+    path('metrics', metrics, name='metrics'),
+    path('audio/<str:name>', play_audio, name='play_audio'),
+    path('view_study_records/', view_study_records, name='view_study_records'),
+    path('view_study_records/json/', study_records_json, name='study_records_json'),
+    path('activity/heatmap/', activity_heatmap, name='activity_heatmap'),
+    path('api/session/<int:group_id>/words/', session_words, name='session_words'),
+    path('api/session/check/', session_check, name='session_check'),
+    path('api/session/<int:group_id>/results/', session_results, name='session_results'),
 ]
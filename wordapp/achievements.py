@@ -0,0 +1,139 @@
+"""
+成就系统
+
+写入学习记录时增量更新 UserStats（总数、连续天数、最近一周的数量），
+跨过阈值时从成就目录中发放成就，查看学习记录时不再扫描历史记录。
+"""
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Achievement, StudyRecord, UserAchievement, UserStats
+
+TOTAL = 'total'    # 累计学习单词数
+STREAK = 'streak'  # 最长连续学习天数
+WEEK = 'week'      # 最近一周学习单词数
+
+# (名称, 描述, 类型, 阈值)
+ACHIEVEMENTS = [
+    ("千里之行", "学习1个单词", TOTAL, 1),
+    ("拾级而上", "学习10个单词", TOTAL, 10),
+    ("积少成多", "学习100个单词", TOTAL, 100),
+    ("词汇大师", "学习500个单词", TOTAL, 500),
+    ("学富五车", "学习1000个单词", TOTAL, 1000),
+    ("心如明镜", "连续学习30天", STREAK, 30),
+    ("清风明月", "连续学习60天", STREAK, 60),
+    ("博闻强识", "在一周内学50个单词", WEEK, 50),
+]
+
+STATS_FIELDS = ['total_records', 'current_streak', 'longest_streak', 'last_study_date', 'recent_counts']
+
+_catalog = {}  # 成就名称 -> Achievement id
+_catalog_lock = threading.Lock()
+
+
+def get_achievement_id(name):
+    """
+    从缓存的成就目录中查找成就，目录由迁移预先写入
+    """
+    with _catalog_lock:
+        if name not in _catalog:
+            _catalog.update(Achievement.objects.values_list('name', 'id'))
+        if name not in _catalog:
+            description = next(d for n, d, kind, threshold in ACHIEVEMENTS if n == name)
+            achievement, created = Achievement.objects.get_or_create(
+                name=name, defaults={'description': description})
+            _catalog[name] = achievement.id
+        return _catalog[name]
+
+
+def clear_catalog_cache():
+    with _catalog_lock:
+        _catalog.clear()
+
+
+def earned(stats, today):
+    values = {
+        TOTAL: stats.total_records,
+        STREAK: stats.longest_streak,
+        WEEK: stats.words_in_week(today),
+    }
+    return {name for name, description, kind, threshold in ACHIEVEMENTS if values[kind] >= threshold}
+
+
+def rebuild_stats(user_id):
+    """
+    根据全部历史记录重新计算统计，只按天聚合，不逐条读取记录
+    """
+    stats = UserStats.objects.filter(user_id=user_id).first() or UserStats(user_id=user_id)
+    stats.total_records = stats.current_streak = stats.longest_streak = 0
+    stats.last_study_date = None
+    stats.recent_counts = {}
+    days = (StudyRecord.objects.filter(user_id=user_id)
+            .annotate(day=TruncDate('timestamp')).values('day')
+            .annotate(count=Count('id')).order_by('day'))
+    for row in days:
+        stats.record(row['day'], row['count'])
+    stats.save()
+    return stats
+
+
+def get_stats(user_id, lock=False):
+    """
+    返回 (stats, rebuilt)，用户还没有统计时从历史记录生成
+
+    lock 为 True 时在当前事务中锁定统计行，读取后修改再保存的调用方需要加锁
+    """
+    stats = UserStats.objects.filter(user_id=user_id)
+    if lock:
+        stats = stats.select_for_update()
+    stats = stats.first()
+    if stats is not None:
+        return stats, False
+    try:
+        with transaction.atomic():
+            return rebuild_stats(user_id), True
+    except IntegrityError:
+        # 另一个请求刚刚创建了统计
+        return UserStats.objects.get(user_id=user_id), False
+
+
+def award(user_id, names):
+    if not names:
+        return
+    owned = set(UserAchievement.objects.filter(user_id=user_id, achievement__name__in=names)
+                .values_list('achievement__name', flat=True))
+    UserAchievement.objects.bulk_create([
+        UserAchievement(user_id=user_id, achievement_id=get_achievement_id(name))
+        for name in sorted(names) if name not in owned
+    ], ignore_conflicts=True)  # 并发请求可能同时发放同一个成就
+
+
+def record_study(user_id, when=None, count=1):
+    """
+    学习记录写入后调用，更新统计并发放新达成的成就
+    """
+    day = timezone.localdate(when) if when else timezone.localdate()
+    # 在 IMMEDIATE 事务中加锁重新读取统计，并发的请求和延迟写入线程不会互相覆盖
+    with transaction.atomic():
+        stats, rebuilt = get_stats(user_id, lock=True)
+        if rebuilt:
+            # 重新统计时已经包含了刚写入的记录
+            before = set()
+        else:
+            before = earned(stats, day)
+            stats.record(day, count)
+            stats.save(update_fields=STATS_FIELDS)
+        new = earned(stats, day) - before
+    award(user_id, new)
+
+
+def add_achievements(user_id):
+    """
+    检查并补发用户已达成但还没有发放的成就
+    """
+    stats, _ = get_stats(user_id)
+    award(user_id, earned(stats, timezone.localdate()))
@@ -0,0 +1,121 @@
+"""
+每日学习汇总
+
+DailyActivity 每个用户每天一行，写入学习记录时更新。
+热力图和连续天数只需读取最近 366 行，与历史记录的多少无关。
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyActivity, StudyRecord
+
+HEATMAP_DAYS = 366
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def record_activity(user_id, day, words_studied=1, distinct_words=1):
+    """
+    把 day 这一天新写入的记录累加到汇总中
+    """
+    updated = DailyActivity.objects.filter(user_id=user_id, date=day).update(
+        words_studied=F('words_studied') + words_studied,
+        distinct_words=F('distinct_words') + distinct_words)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            DailyActivity.objects.create(user_id=user_id, date=day, words_studied=words_studied,
+                                         distinct_words=distinct_words)
+    except IntegrityError:
+        # 另一个请求刚刚创建了这一天的汇总
+        record_activity(user_id, day, words_studied, distinct_words)
+
+
+def record_study_records(user_id, records):
+    """
+    批量写入同一用户的学习记录后调用，按天汇总后每天只更新一次
+    """
+    by_day = {}
+    for record in records:
+        by_day.setdefault(timezone.localdate(record.timestamp), []).append(record)
+    for day, day_records in by_day.items():
+        start, end = day_bounds(day)
+        word_ids = {record.word_id for record in day_records}
+        seen_today = set(StudyRecord.objects.filter(
+            user_id=user_id, word_id__in=word_ids, timestamp__gte=start, timestamp__lt=end)
+            .exclude(pk__in=[record.pk for record in day_records])
+            .values_list('word_id', flat=True))
+        record_activity(user_id, day, len(day_records), len(word_ids - seen_today))
+
+
+def backfill(user_ids=None, batch_size=1000):
+    """
+    根据历史学习记录重新生成汇总，返回写入的行数
+    """
+    records = StudyRecord.objects.all()
+    existing = DailyActivity.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+        existing = existing.filter(user_id__in=user_ids)
+    rows = (records.annotate(day=TruncDate('timestamp'))
+            .values('user_id', 'day')
+            .annotate(words_studied=Count('id'), distinct_words=Count('word_id', distinct=True))
+            .order_by('user_id', 'day'))
+    created = 0
+    with transaction.atomic():
+        existing.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(DailyActivity(user_id=row['user_id'], date=row['day'],
+                                       words_studied=row['words_studied'],
+                                       distinct_words=row['distinct_words']))
+            if len(batch) >= batch_size:
+                DailyActivity.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        DailyActivity.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def streak_stats(dates, today):
+    """
+    根据有学习记录的日期计算连续天数
+
+    今天还没学习时，截至昨天的连续天数仍然算作当前连续天数
+    """
+    dates = sorted(set(dates))
+    longest = run = 0
+    previous = None
+    for day in dates:
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    current = 0
+    if dates and today - dates[-1] <= timedelta(days=1):
+        current = run
+    return {'current': current, 'longest': longest}
+
+
+def heatmap(user_id, today=None):
+    today = today or timezone.localdate()
+    start = today - timedelta(days=HEATMAP_DAYS - 1)
+    rows = list(DailyActivity.objects.filter(user_id=user_id, date__gte=start, date__lte=today)
+                .order_by('date').values_list('date', 'words_studied', 'distinct_words'))
+    return {
+        'start': start.isoformat(),
+        'end': today.isoformat(),
+        'days': {day.isoformat(): {'words': words, 'distinct': distinct}
+                 for day, words, distinct in rows},
+        'active_days': len(rows),
+        'total_words': sum(words for day, words, distinct in rows),
+        'streak': streak_stats([day for day, words, distinct in rows], today),
+    }
@@ -1,7 +1,77 @@
-from django.contrib import admin
-from .models import Word, WordGroup, StudyRecord, Achievement,UserAchievement
+import os
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.http import FileResponse, Http404, HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from .jobs import enqueue
+from .models import Job, Word, WordGroup, StudyRecord, Achievement,UserAchievement
+from .profiling import list_profiles, profile_path, profile_summary
+
+
+@admin.register(WordGroup)
+class WordGroupAdmin(admin.ModelAdmin):
+    actions = ['pregenerate_tts']
+
+    @admin.action(description='预生成所选单词组的语音')
+    def pregenerate_tts(self, request, queryset):
+        group_ids = list(queryset.visible().values_list('id', flat=True))
+        if not group_ids:
+            self.message_user(request, '所选单词组都已删除', messages.WARNING)
+            return
+        job = enqueue('warm_tts', {'group_ids': group_ids}, user=request.user)
+        self.message_user(request, f'正在后台生成语音（任务 #{job.id}）', messages.SUCCESS)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'attempts', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['locked_by', 'locked_until', 'created_at', 'finished_at']
+
+
+def get_profile_path(name):
+    file_path = profile_path(name)
+    if file_path is None or not os.path.exists(file_path):
+        raise Http404('剖析结果不存在')
+    return file_path
+
+
+def profiles_view(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': '性能剖析结果',
+        'profiles': list_profiles(),
+        'enabled': getattr(settings, 'PROFILING_ENABLED', False),
+    }
+    return TemplateResponse(request, 'admin/wordapp/profiles.html', context)
+
+
+def profile_stats_view(request, name):
+    return HttpResponse(profile_summary(get_profile_path(name)), content_type='text/plain; charset=utf-8')
+
+
+def profile_download_view(request, name):
+    # 可以用 snakeviz 等工具打开
+    return FileResponse(open(get_profile_path(name), 'rb'), as_attachment=True, filename=name)
+
+
+def get_urls(get_site_urls=admin.site.get_urls):
+    # 剖析结果是 PROFILING_DIR 中的文件，没有对应的模型，作为后台管理的自定义页面，admin_view 只允许管理员访问
+    return [
+        path('profiles/', admin.site.admin_view(profiles_view), name='profiles'),
+        path('profiles/<str:name>/stats/', admin.site.admin_view(profile_stats_view), name='profile_stats'),
+        path('profiles/<str:name>/download/', admin.site.admin_view(profile_download_view), name='profile_download'),
+    ] + get_site_urls()
+
+
+admin.site.get_urls = get_urls
+# 首页在应用列表下方加上剖析结果的链接
+admin.site.index_template = 'admin/wordapp/index.html'
+
+
 admin.site.register(Word)
-admin.site.register(WordGroup)
 admin.site.register(StudyRecord)
 admin.site.register(Achievement)
 admin.site.register(UserAchievement)
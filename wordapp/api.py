@@ -0,0 +1,135 @@
+"""
+背单词的 JSON 接口
+
+客户端一次取一批单词，在本地用 check 校验猜测，
+整轮结束后把所有结果一次提交，服务器批量写入学习记录。
+"""
+import hashlib
+import json
+
+from django.core import signing
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import StudyProgress, Word, WordGroup
+from .sampling import get_recent, sample_words
+from .views import get_feedback
+from .writebehind import save_study_records
+
+TOKEN_SALT = 'wordapp.api.session'
+TOKEN_MAX_AGE = 24 * 60 * 60
+DEFAULT_BATCH_SIZE = 20
+MAX_BATCH_SIZE = 50
+MAX_RESULTS = 200
+
+
+def make_token(word):
+    return signing.dumps(word.id, salt=TOKEN_SALT, compress=True)
+
+
+def read_token(token):
+    """
+    返回 token 中的单词 id，无效或过期时返回 None
+    """
+    try:
+        return int(signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def answer_check(token, answer):
+    # 客户端计算 sha256(token + ':' + 猜测) 与之比较，就能在本地判断对错
+    return hashlib.sha256(f'{token}:{answer}'.encode('utf-8')).hexdigest()
+
+
+def is_correct(word, guess):
+    return guess == word.word
+
+
+def error(message, status=400):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+def parse_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+@require_GET
+def session_words(request, group_id):
+    # 一次返回一批要学习的单词
+    try:
+        count = min(max(int(request.GET.get('n', DEFAULT_BATCH_SIZE)), 1), MAX_BATCH_SIZE)
+    except ValueError:
+        return error('n 必须是整数')
+    if not WordGroup.objects.visible().filter(id=group_id).exists():
+        return error('单词组不存在', status=404)
+    if request.user.is_authenticated:
+        study_progress, created = StudyProgress.objects.get_or_create(
+            user=request.user, word_group_id=group_id)
+        if created:
+            study_progress.reset_progress()
+        words = study_progress.next_words(count)
+    else:
+        words = sample_words(group_id, count, get_recent(request, group_id))
+    batch = []
+    for word in words:
+        token = make_token(word)
+        batch.append({'id': word.id, 'meaning': word.meaning, 'length': len(word.word),
+                      'token': token, 'check': answer_check(token, word.word)})
+    return JsonResponse({'status': 'success', 'words': batch})
+
+
+@require_POST
+def session_check(request):
+    # 校验一次猜测，返回和游戏页面相同的颜色提示
+    data = parse_json(request)
+    if not isinstance(data, dict):
+        return error('请求格式错误')
+    word_id = read_token(data.get('token'))
+    guess = data.get('guess')
+    if word_id is None or not isinstance(guess, str):
+        return error('token 或 guess 无效')
+    word = Word.objects.filter(pk=word_id).only('word').first()
+    if word is None:
+        return error('单词不存在', status=404)
+    return JsonResponse({'status': 'success', 'correct': is_correct(word, guess),
+                         'feedback': get_feedback(word.word, guess)})
+
+
+@require_POST
+def session_results(request, group_id):
+    # 一轮结束后提交全部结果，猜对的单词批量写入学习记录
+    data = parse_json(request)
+    results = data.get('results') if isinstance(data, dict) else None
+    if not isinstance(results, list) or len(results) > MAX_RESULTS:
+        return error(f'results 必须是不超过 {MAX_RESULTS} 项的列表')
+
+    guesses = {}
+    for item in results:
+        if not isinstance(item, dict) or not isinstance(item.get('guess'), str):
+            return error('results 中的每一项都需要 token 和 guess')
+        word_id = read_token(item.get('token'))
+        if word_id is not None:
+            guesses.setdefault(word_id, item['guess'])  # 同一个单词只记一次
+
+    # 已删除的单词组不再写入学习记录
+    words = Word.objects.filter(pk__in=guesses, group_id=group_id, group__deleted_at__isnull=True).in_bulk()
+    checked = []
+    correct_words = []
+    for word_id, guess in guesses.items():
+        word = words.get(word_id)
+        if word is None:
+            continue
+        correct = is_correct(word, guess)
+        checked.append({'id': word_id, 'correct': correct, 'feedback': get_feedback(word.word, guess)})
+        if correct:
+            correct_words.append(word)
+
+    saved = 0
+    if request.user.is_authenticated:
+        save_study_records(request.user, correct_words)
+        saved = len(correct_words)
+    return JsonResponse({'status': 'success', 'results': checked, 'saved': saved})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WordappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "wordapp"
+
+    def ready(self):
+        from . import perf, signals  # noqa: F401
@@ -0,0 +1,110 @@
+"""
+音频文件下发
+
+文件名由内容决定（见 tts_cache），因此可以返回强 ETag 并让浏览器永久缓存。
+支持条件请求 (If-None-Match) 和单段 Range 请求，完整下发时使用 FileResponse，
+WSGI 服务器可以走 sendfile。
+"""
+import os
+import re
+
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
+from django.utils.http import parse_etags, quote_etag
+
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """
+    解析 Range 头，返回 (start, end)（包含 end）；
+    多段或无法识别时返回 None 表示忽略；范围无法满足时抛出 ValueError
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N 表示最后 N 个字节
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+class RangeFileWrapper:
+    """
+    按块读取文件中的一段，响应结束时由 Django 调用 close 关闭文件
+    """
+
+    def __init__(self, f, start, length):
+        self.f = f
+        self.start = start
+        self.length = length
+
+    def __iter__(self):
+        self.f.seek(self.start)
+        remaining = self.length
+        while remaining > 0:
+            data = self.f.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.f.close()
+
+
+def serve_audio(request, path, content_type='audio/mpeg'):
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        raise Http404('音频文件不存在')
+    size = os.fstat(f.fileno()).st_size
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    etag = quote_etag(f'{name}-{size:x}')
+
+    def with_cache_headers(response):
+        response['ETag'] = etag
+        response['Cache-Control'] = CACHE_CONTROL
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if '*' in etags or etag in etags:
+            f.close()
+            return with_cache_headers(HttpResponseNotModified())
+
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            f.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return with_cache_headers(response)
+        if byte_range is not None:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                RangeFileWrapper(f, start, length), status=206, content_type=content_type)
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            return with_cache_headers(response)
+
+    return with_cache_headers(FileResponse(f, content_type=content_type))
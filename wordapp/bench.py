@@ -0,0 +1,410 @@
+"""
+基准测试数据和端到端压测
+
+seed 按随机种子生成固定的测试数据（用户名和单词组名以 bench_ 开头），
+run_scenarios 用 Django 测试客户端在进程内请求各个页面，统计延迟分位数、
+每个请求的 SQL 次数（来自 Server-Timing 响应头）和吞吐量。
+run_asgi 直接调用 ASGI 应用，比较不同并发数下的吞吐量。
+"""
+import asyncio
+import math
+import os
+import random
+import re
+import string
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .achievements import award, earned, rebuild_stats
+from .activity import backfill
+from .caching import bump_group_version
+from .models import Job, StudyProgress, StudyRecord, Word, WordGroup, pack_ids
+from .tts_cache import FakeSynthesizer
+
+PREFIX = 'bench_'
+STAFF_USERNAME = PREFIX + 'staff'
+PASSWORD = 'bench-password'
+UPLOAD_GROUP = PREFIX + 'upload'
+HOST = '127.0.0.1'
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+@dataclass
+class SeedResult:
+    users: int = 0
+    groups: int = 0
+    words: int = 0
+    records: int = 0
+    progress: int = 0
+    elapsed: float = 0.0
+
+    def summary(self):
+        return (f'用户 {self.users}，单词组 {self.groups}，单词 {self.words}，学习记录 {self.records}，'
+                f'学习进度 {self.progress}，用时 {self.elapsed:.1f} 秒')
+
+
+def clear():
+    """
+    删除以前生成的测试数据
+    """
+    users = User.objects.filter(username__startswith=PREFIX)
+    # 学习记录可能有几百万条，先单独批量删除，避免级联删除时逐条收集
+    StudyRecord.objects.filter(user__in=users).delete()
+    users.delete()
+    groups = WordGroup.objects.filter(name__startswith=PREFIX)
+    group_ids = list(groups.values_list('id', flat=True))
+    StudyRecord.objects.filter(word__group_id__in=group_ids).delete()
+    Word.objects.filter(group_id__in=group_ids).delete()
+    groups.delete()
+    for group_id in group_ids:
+        bump_group_version(group_id)
+
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for i in range(rng.randint(3, 10)))
+
+
+def random_words(rng, count):
+    # 同一单词组内的单词不能重复
+    words = {}
+    while len(words) < count:
+        words.setdefault(random_word(rng))
+    return list(words)
+
+
+def seed(seed=0, users=2000, groups=200, words_per_group=100, records=1_000_000,
+         progress_per_user=3, days=365, batch_size=10000, progress=None):
+    """
+    生成测试数据，返回 SeedResult；相同的参数总是生成相同的数据
+
+    progress 是可选的回调，每写入一批学习记录调用一次 progress(result)
+    """
+    rng = random.Random(seed)
+    result = SeedResult()
+    start = time.perf_counter()
+    password = make_password(PASSWORD)
+    User.objects.create(username=STAFF_USERNAME, password=password, is_staff=True)
+    User.objects.bulk_create(
+        [User(username=f'{PREFIX}user_{i:05d}', password=password) for i in range(users)],
+        batch_size=batch_size)
+    user_ids = list(User.objects.filter(username__startswith=f'{PREFIX}user_')
+                    .order_by('username').values_list('id', flat=True))
+    result.users = len(user_ids)
+
+    WordGroup.objects.bulk_create([WordGroup(name=f'{PREFIX}group_{i:04d}', word_count=words_per_group)
+                                   for i in range(groups)])
+    group_ids = list(WordGroup.objects.filter(name__startswith=f'{PREFIX}group_')
+                     .order_by('name').values_list('id', flat=True))
+    result.groups = len(group_ids)
+    Word.objects.bulk_create(
+        [Word(word=word, meaning=f'释义 {g}-{i}', group_id=group_id)
+         for g, group_id in enumerate(group_ids) for i, word in enumerate(random_words(rng, words_per_group))],
+        batch_size=batch_size)
+    group_words = {group_id: [] for group_id in group_ids}
+    for word_id, group_id in Word.objects.filter(group_id__in=group_ids).order_by('id').values_list('id', 'group'):
+        group_words[group_id].append(word_id)
+    word_ids = [word_id for ids in group_words.values() for word_id in ids]
+    result.words = len(word_ids)
+
+    # 学习记录直接用 executemany 写入，auto_now_add 不会覆盖生成的时间
+    table = connection.ops.quote_name(StudyRecord._meta.db_table)
+    sql = f'INSERT INTO {table} (user_id, word_id, timestamp) VALUES (%s, %s, %s)'
+    now = timezone.now()
+    span = days * 24 * 3600
+    while result.records < records:
+        count = min(batch_size, records - result.records)
+        rows = [(rng.choice(user_ids), rng.choice(word_ids),
+                 connection.ops.adapt_datetimefield_value(now - timedelta(seconds=rng.random() * span)))
+                for i in range(count)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        result.records += count
+        result.elapsed = time.perf_counter() - start
+        if progress is not None:
+            progress(result)
+
+    study_progress = []
+    for user_id in user_ids:
+        for group_id in rng.sample(group_ids, min(progress_per_user, len(group_ids))):
+            ids = list(group_words[group_id])
+            rng.shuffle(ids)
+            cursor = rng.randrange(len(ids) or 1)
+            study_progress.append(StudyProgress(user_id=user_id, word_group_id=group_id, queue=pack_ids(ids),
+                                                cursor=cursor, remaining=len(ids) - cursor))
+    StudyProgress.objects.bulk_create(study_progress, batch_size=batch_size)
+    result.progress = len(study_progress)
+
+    # 汇总数据和成就与正常写入学习记录时保持一致
+    backfill(user_ids, batch_size=batch_size)
+    today = timezone.localdate()
+    for user_id in user_ids:
+        award(user_id, earned(rebuild_stats(user_id), today))
+    for group_id in group_ids:
+        bump_group_version(group_id)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def percentile(values, p):
+    """
+    最近秩法计算 p 分位数
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'p50_ms': percentile(self.latencies, 50) * 1000,
+            'p95_ms': percentile(self.latencies, 95) * 1000,
+            'p99_ms': percentile(self.latencies, 99) * 1000,
+            'queries': sum(self.queries) / len(self.queries) if self.queries else 0.0,
+            'throughput': self.throughput,
+        }
+
+
+class Scenarios:
+    """
+    压测场景，每个场景是一个 (client, rng) -> response 的方法
+    """
+    names = ('game', 'game_answer', 'display_words', 'view_study_records', 'upload_csv', 'tts')
+
+    def __init__(self):
+        self.group_ids = list(WordGroup.objects.filter(name__startswith=f'{PREFIX}group_')
+                              .order_by('id').values_list('id', flat=True))
+        if not self.group_ids:
+            raise ValueError('没有测试数据，请先运行 seed_bench')
+        self.user_ids = list(User.objects.filter(username__startswith=f'{PREFIX}user_')
+                             .order_by('id').values_list('id', flat=True))
+        self.staff = User.objects.get(username=STAFF_USERNAME)
+        self.words = list(Word.objects.filter(group_id__in=self.group_ids[:10]).values_list('id', 'word', 'group'))
+
+    def client(self, name, rng):
+        client = Client(HTTP_HOST=HOST)
+        if name == 'upload_csv':
+            client.force_login(self.staff)
+        elif name != 'tts':
+            client.force_login(User.objects.get(pk=rng.choice(self.user_ids)))
+        return client
+
+    def game(self, client, rng):
+        return client.get(reverse('game', args=[rng.choice(self.group_ids)]))
+
+    def game_answer(self, client, rng):
+        word_id, word, group_id = rng.choice(self.words)
+        return client.post(reverse('game', args=[group_id]), {'word_id': word_id, 'guess': word})
+
+    def display_words(self, client, rng):
+        return client.get(reverse('display_words'))
+
+    def view_study_records(self, client, rng):
+        return client.get(reverse('view_study_records'))
+
+    def upload_csv(self, client, rng):
+        # 只包括保存文件和创建导入任务，导入本身由 run_worker 执行
+        content = '\n'.join(f'{random_word(rng)},释义' for i in range(200)).encode('utf-8')
+        upload = SimpleUploadedFile(f'{UPLOAD_GROUP}.csv', content, content_type='text/csv')
+        return client.post(reverse('upload_csv'), {'csv_file': upload})
+
+    def tts(self, client, rng):
+        # 大约一半的请求命中缓存
+        word = self.words[rng.randrange(min(len(self.words), 50))][1] if rng.random() < 0.5 else random_word(rng)
+        return client.get(reverse('tts', args=[word]))
+
+    def cleanup(self):
+        groups = WordGroup.objects.filter(name=UPLOAD_GROUP)
+        # 上传只创建导入任务，删除任务和等待导入的文件
+        jobs = Job.objects.filter(kind='import_words', args__group_id__in=list(groups.values_list('id', flat=True)))
+        for job in jobs:
+            if os.path.exists(job.args['path']):
+                os.remove(job.args['path'])
+        jobs.delete()
+        for group_id in groups.values_list('id', flat=True):
+            Word.objects.filter(group_id=group_id).delete()
+            bump_group_version(group_id)
+        groups.delete()
+
+
+def run_scenario(scenarios, name, requests, concurrency, seed=0):
+    result = ScenarioResult(name)
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    action = getattr(scenarios, name)
+
+    def worker(index, count):
+        rng = random.Random(f'{seed}-{name}-{index}')
+        client = scenarios.client(name, rng)
+        for i in range(count):
+            start = time.perf_counter()
+            response = action(client, rng)
+            elapsed = time.perf_counter() - start
+            match = QUERIES_RE.search(response.get('Server-Timing', ''))
+            with lock:
+                result.latencies.append(elapsed)
+                if match:
+                    result.queries.append(int(match.group(1)))
+                if response.status_code >= 400:
+                    result.errors += 1
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        worker(0, requests)  # 在当前线程中运行，使用当前的数据库连接
+    else:
+        threads = [threading.Thread(target=worker, args=(i, count)) for i, count in enumerate(per_worker)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def run_scenarios(names=Scenarios.names, requests=200, concurrency=1, seed=0):
+    """
+    依次运行各个场景，返回 {场景名: ScenarioResult}
+    """
+    scenarios = Scenarios()
+    results = {}
+    with tempfile.TemporaryDirectory() as tts_dir, override_settings(
+            TTS_CACHE_DIR=tts_dir, TTS_SYNTHESIZER='wordapp.tts_cache.FakeSynthesizer'):
+        try:
+            for name in names:
+                results[name] = run_scenario(scenarios, name, requests, concurrency, seed)
+        finally:
+            scenarios.cleanup()
+    return results
+
+
+class SlowFakeSynthesizer(FakeSynthesizer):
+    """
+    模拟 edge-tts 网络延迟的假合成器
+    """
+
+    def __init__(self, delay=0.05):
+        super().__init__(delay)
+
+
+ASGI_SCENARIOS = ('game', 'view_study_records', 'tts')
+
+
+async def asgi_get(app, path, cookie=''):
+    """
+    在进程内直接调用 ASGI 应用，返回状态码
+    """
+    headers = [(b'host', HOST.encode())]
+    if cookie:
+        headers.append((b'cookie', cookie.encode()))
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'headers': headers, 'client': (HOST, 50000), 'server': (HOST, 80),
+    }
+    status = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def run_asgi_scenario(app, name, paths, cookies, requests, concurrency):
+    """
+    用 concurrency 个协程并发请求 paths(i)，返回 ScenarioResult
+    """
+    result = ScenarioResult(name)
+    pending = iter(range(requests))
+
+    async def worker():
+        for i in pending:
+            start = time.perf_counter()
+            status = await asgi_get(app, paths(i), cookies[i % len(cookies)] if cookies else '')
+            result.latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                result.errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for i in range(concurrency)))
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+def asgi_application(sync_static=False):
+    """
+    按当前 MIDDLEWARE 创建 ASGI 应用；sync_static 为 True 时换回只支持同步调用的
+    WhiteNoiseMiddleware，即改为异步视图之前的部署方式
+    """
+    middleware = list(settings.MIDDLEWARE)
+    if sync_static:
+        middleware = ['whitenoise.middleware.WhiteNoiseMiddleware' if m == 'wordapp.middleware.StaticFilesMiddleware'
+                      else m for m in middleware]
+    with override_settings(MIDDLEWARE=middleware):
+        return ASGIHandler()
+
+
+def run_asgi(names=ASGI_SCENARIOS, levels=(1, 8, 32), requests=200, sync_static=False, users=8, seed=0):
+    """
+    在不同并发数下运行 ASGI 压测，返回 [(场景名, 并发数, ScenarioResult)]
+    """
+    rng = random.Random(seed)
+    cookies = []
+    if set(names) - {'tts'}:
+        scenarios = Scenarios()
+        for user_id in rng.sample(scenarios.user_ids, min(users, len(scenarios.user_ids))):
+            client = Client(HTTP_HOST=HOST)
+            client.force_login(User.objects.get(pk=user_id))
+            cookies.append(f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}')
+        group_ids = scenarios.group_ids
+    paths = {
+        'game': lambda i: reverse('game', args=[group_ids[i % len(group_ids)]]),
+        'view_study_records': lambda i: reverse('view_study_records'),
+        # 每次都是新单词，必须等待合成
+        'tts': lambda i: reverse('tts', args=[f'{random_word(random.Random(i))}{time.monotonic_ns()}']),
+    }
+    results = []
+    with tempfile.TemporaryDirectory() as tts_dir, override_settings(
+            TTS_CACHE_DIR=tts_dir, TTS_SYNTHESIZER='wordapp.bench.SlowFakeSynthesizer'):
+        app = asgi_application(sync_static)
+        for name in names:
+            for level in levels:
+                result = asyncio.run(run_asgi_scenario(
+                    app, name, paths[name], cookies if name != 'tts' else [], requests, level))
+                results.append((name, level, result))
+    return results
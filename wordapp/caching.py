@@ -0,0 +1,31 @@
+"""
+单词组相关缓存的版本号
+
+缓存键中带上单词组的版本号，单词组内容变化时只需更新版本号，
+旧的缓存条目不再被读取，随后自然过期。
+"""
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'wordgroup:{}:version'
+
+
+def group_version(group_id):
+    key = VERSION_KEY.format(group_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_group_version(group_id):
+    """
+    单词组的单词被增删改后调用，使该组的缓存失效
+    """
+    cache.set(VERSION_KEY.format(group_id), time.time_ns(), None)
+
+
+def group_cache_key(group_id, name, *parts):
+    return ':'.join(['wordgroup', str(group_id), str(group_version(group_id)), name, *map(str, parts)])
@@ -0,0 +1,45 @@
+"""
+单词组和学习进度上的计数
+
+WordGroup.word_count 在导入和删除单词时增量更新，StudyProgress.remaining 在取词和重新排队时更新，
+显示单词组列表和学习进度时不需要 COUNT 查询。不经过这些路径的修改（例如在后台管理中逐个添加单词）
+之后可以用 manage.py recount 重新计算。
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Length
+
+from .models import StudyProgress, Word, WordGroup
+
+
+def add_word_count(group_id, delta):
+    """
+    在当前事务中调整单词组的单词数
+    """
+    if delta:
+        WordGroup.objects.filter(id=group_id).update(word_count=F('word_count') + delta)
+
+
+def recount_groups(group_ids=None):
+    """
+    重新计算单词组的单词数，返回修正的单词组数
+    """
+    actual = (Word.objects.filter(group=OuterRef('pk')).order_by()
+              .values('group').annotate(count=Count('*')).values('count'))
+    groups = WordGroup.objects.annotate(actual=Coalesce(Subquery(actual), Value(0), output_field=IntegerField()))
+    if group_ids is not None:
+        groups = groups.filter(id__in=group_ids)
+    wrong = [WordGroup(id=group_id, word_count=count)
+             for group_id, count in groups.exclude(word_count=F('actual')).values_list('id', 'actual')]
+    WordGroup.objects.bulk_update(wrong, ['word_count'], batch_size=500)
+    return len(wrong)
+
+
+def recount_progress(group_ids=None):
+    """
+    根据队列长度重新计算学习进度中本轮剩余的单词数，返回修正的行数
+    """
+    progress = StudyProgress.objects.all()
+    if group_ids is not None:
+        progress = progress.filter(word_group_id__in=group_ids)
+    remaining = Length('queue') / StudyProgress.ID_SIZE - F('cursor')
+    return progress.exclude(remaining=remaining).update(remaining=remaining)
@@ -0,0 +1,116 @@
+"""
+单词组和学习记录的流式导出
+
+查询集用 iterator() 分块读取，每读一块就编码成一段响应内容发送出去，内存占用只和块大小有关，
+与导出的总行数无关。gzip 为 True 时边生成边压缩。
+在 ASGI 下用异步迭代器逐块发送，否则 Django 会先把同步迭代器的全部内容读入内存。
+"""
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from .models import StudyRecord, Word
+
+EXPORT_CHUNK_SIZE = 2000
+RECORD_FIELDS = ('timestamp', 'word', 'meaning', 'group')
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def chunked(rows, size=EXPORT_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(rows, header=None):
+    """
+    把 rows 编码成 CSV，每块产出一段 bytes
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    for chunk in chunked(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_ndjson(rows, fields):
+    # 每行一个 JSON 对象
+    for chunk in chunked(rows):
+        yield ''.join(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n' for row in chunk).encode()
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 表示 gzip 格式
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def group_rows(group):
+    return (Word.objects.filter(group=group).order_by('id')
+            .values_list('word', 'meaning').iterator(chunk_size=EXPORT_CHUNK_SIZE))
+
+
+def record_rows(user_id):
+    records = (StudyRecord.objects.filter(user_id=user_id).order_by('timestamp', 'id')
+               .values_list('timestamp', 'word__word', 'word__meaning', 'word__group__name')
+               .iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    return ((timestamp.isoformat(), word, meaning, group) for timestamp, word, meaning, group in records)
+
+
+def export_group(group):
+    """
+    单词组导出为没有表头的 word,meaning，和 upload_csv 接受的格式相同
+    """
+    return iter_csv(group_rows(group))
+
+
+def export_records(user_id, format='csv'):
+    if format == 'ndjson':
+        return iter_ndjson(record_rows(user_id), RECORD_FIELDS)
+    return iter_csv(record_rows(user_id), header=RECORD_FIELDS)
+
+
+async def aiter_sync(iterator):
+    # 每块都回到同一个同步线程中读取，和视图使用同一个数据库连接
+    iterator = iter(iterator)
+    sentinel = object()
+    while (chunk := await sync_to_async(next, thread_sensitive=True)(iterator, sentinel)) is not sentinel:
+        yield chunk
+
+
+def streaming_response(request, chunks, filename, content_type, gzip=False):
+    """
+    返回作为附件下载的流式响应
+    """
+    if gzip:
+        chunks = iter_gzip(chunks)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    if isinstance(request, ASGIRequest):
+        chunks = aiter_sync(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response.headers['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
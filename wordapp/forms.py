@@ -4,7 +4,8 @@ from .models import WordGroup
 
 class UploadCSVForm(forms.Form):
     csv_file = forms.FileField(label='选择 CSV 文件')
+    delete_missing = forms.BooleanField(label='删除单词组中文件里没有的单词', required=False)
 
 class WordGroupForm(forms.Form):#开始游戏时的表格
     group = forms.ModelChoiceField(
-        queryset=WordGroup.objects.all(), empty_label=None)
+        queryset=WordGroup.objects.visible(), empty_label=None)
@@ -0,0 +1,167 @@
+"""
+CSV 单词导入
+
+按块流式读取 CSV 文件，每块在一个事务中用 bulk_create 批量写入，
+格式错误的行会被跳过并记录行号，不会中断整个导入。
+
+同一单词组内单词唯一，重复上传同一个文件是幂等的：先一次读出组内已有的单词，
+在内存中对比，只写入新单词和释义有变化的单词（INSERT ... ON CONFLICT DO UPDATE），
+delete_missing 为 True 时再删除文件中没有的单词。
+"""
+import csv
+import time
+from dataclasses import dataclass, field
+from io import TextIOWrapper
+
+from django.db import transaction
+
+from . import metrics
+from .caching import bump_group_version
+from .counters import add_word_count
+from .models import Word
+
+DEFAULT_CHUNK_SIZE = 1000
+DELETE_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 50  # 最多保留多少条错误明细，避免超大文件占满内存
+
+WORD_MAX_LENGTH = Word._meta.get_field('word').max_length
+MEANING_MAX_LENGTH = Word._meta.get_field('meaning').max_length
+
+
+@dataclass
+class ImportResult:
+    group: object
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)  # [(行号, 原因), ...]
+    elapsed: float = 0.0
+
+    @property
+    def imported(self):
+        return self.inserted + self.updated
+
+    @property
+    def rows_per_second(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return (self.imported + self.unchanged + self.skipped) / self.elapsed
+
+    def add_error(self, line_number, reason):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, reason))
+
+    def summary(self):
+        return (f'新增 {self.inserted} 个单词，更新 {self.updated} 个，删除 {self.removed} 个，'
+                f'未变 {self.unchanged} 行，跳过 {self.skipped} 行，用时 {self.elapsed:.2f} 秒（{self.rows_per_second:.0f} 行/秒）')
+
+
+def parse_row(row):
+    """
+    校验一行 CSV，返回 (word, meaning)，格式错误时抛出 ValueError
+    """
+    if len(row) != 2:
+        raise ValueError(f'应为 2 列，实际为 {len(row)} 列')
+    word, meaning = (value.strip() for value in row)
+    if not word or not meaning:
+        raise ValueError('单词或释义为空')
+    if '\ufffd' in word or '\ufffd' in meaning:
+        raise ValueError('不是有效的 UTF-8 编码')
+    if len(word) > WORD_MAX_LENGTH:
+        raise ValueError(f'单词超过 {WORD_MAX_LENGTH} 个字符')
+    if len(meaning) > MEANING_MAX_LENGTH:
+        raise ValueError(f'释义超过 {MEANING_MAX_LENGTH} 个字符')
+    return word, meaning
+
+
+def iter_rows(binary_file, encoding='utf-8-sig'):
+    """
+    逐行读取二进制文件中的 CSV，产出 (行号, row)，空行直接忽略
+    """
+    text = TextIOWrapper(binary_file, encoding=encoding, errors='replace', newline='')
+    try:
+        reader = csv.reader(text)
+        for row in reader:
+            if not row or not any(value.strip() for value in row):
+                continue
+            yield reader.line_num, row
+    finally:
+        # 避免 TextIOWrapper 被回收时顺带关闭上传文件
+        text.detach()
+
+
+def import_words(binary_file, group, chunk_size=DEFAULT_CHUNK_SIZE, progress=None, delete_missing=False):
+    """
+    把 CSV 文件中的单词导入到 group，返回 ImportResult
+
+    已有的单词更新释义，文件中同一个单词出现多次时以最后一次为准；
+    delete_missing 为 True 时删除组内文件中没有的单词。
+    progress 是可选的回调，每写入一块调用一次 progress(result)
+    """
+    result = ImportResult(group=group)
+    start = time.perf_counter()
+    # 组内已有单词的释义，写入后同步更新，用来区分新增、更新和未变
+    meanings = dict(Word.objects.filter(group=group).values_list('word', 'meaning'))
+    existing = set(meanings)
+    seen = set()
+    batch = {}
+
+    def flush():
+        inserted = sum(1 for word in batch if word not in meanings)
+        with transaction.atomic():
+            Word.objects.bulk_create(
+                [Word(word=word, meaning=meaning, group=group) for word, meaning in batch.items()],
+                update_conflicts=True, unique_fields=['group', 'word'], update_fields=['meaning'])
+            add_word_count(group.id, inserted)
+        result.inserted += inserted
+        result.updated += len(batch) - inserted
+        meanings.update(batch)
+        batch.clear()
+        result.elapsed = time.perf_counter() - start
+        if progress is not None:
+            progress(result)
+
+    for line_number, row in iter_rows(binary_file):
+        try:
+            word, meaning = parse_row(row)
+        except ValueError as e:
+            result.add_error(line_number, str(e))
+            continue
+        seen.add(word)
+        if batch.get(word, meanings.get(word)) == meaning:
+            result.unchanged += 1
+            continue
+        batch[word] = meaning
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+    if delete_missing:
+        result.removed = delete_words(group, existing - seen)
+    if result.imported or result.removed:
+        bump_group_version(group.id)
+
+    result.elapsed = time.perf_counter() - start
+    metrics.IMPORT_ROWS.inc('imported', amount=result.imported)
+    metrics.IMPORT_ROWS.inc('unchanged', amount=result.unchanged)
+    metrics.IMPORT_ROWS.inc('skipped', amount=result.skipped)
+    metrics.IMPORT_SECONDS.inc(amount=result.elapsed)
+    return result
+
+
+def delete_words(group, words):
+    """
+    分块删除组内的指定单词（相关的学习记录一起删除），返回删除的单词数
+    """
+    words = sorted(words)
+    removed = 0
+    for start in range(0, len(words), DELETE_CHUNK_SIZE):
+        with transaction.atomic():
+            deleted, per_model = Word.objects.filter(
+                group=group, word__in=words[start:start + DELETE_CHUNK_SIZE]).delete()
+            add_word_count(group.id, -per_model.get(Word._meta.label, 0))
+        removed += per_model.get(Word._meta.label, 0)
+    return removed
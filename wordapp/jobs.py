@@ -0,0 +1,238 @@
+"""
+数据库中的后台任务队列
+
+耗时的操作（大文件导入、删除单词组、预生成语音）在请求中只调用 enqueue 写入一条 Job，
+由 manage.py run_worker 进程领取执行，不需要额外的消息服务。
+
+领取任务时用条件 UPDATE 设置租约，同一个任务只会被一个 worker 领到；执行中每次汇报进度都会续租，
+worker 异常退出后租约到期，任务由其他 worker 重新执行。失败的任务按指数退避重试，
+达到 max_attempts 次后标记为失败。
+"""
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importer import import_words
+from .models import Job, Word, WordGroup
+from .purge import hide_group, purge_group
+from .tts_cache import get_audio_cache, warm
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_BACKOFF = 5.0
+CLAIM_CANDIDATES = 10
+WARM_BATCH_SIZE = 50
+
+TASKS = {}
+
+
+def task(kind):
+    """
+    注册任务函数，执行时调用 func(job, **job.args)，返回值保存为任务结果
+    """
+    def decorator(func):
+        TASKS[kind] = func
+        return func
+    return decorator
+
+
+class LeaseLost(Exception):
+    """
+    租约已经过期并被其他 worker 接手，当前的执行应当放弃
+    """
+
+
+def lease_duration():
+    return timedelta(seconds=getattr(settings, 'JOBS_LEASE_SECONDS', DEFAULT_LEASE_SECONDS))
+
+
+def enqueue(kind, args=None, user=None):
+    """
+    创建一个等待执行的任务并返回
+    """
+    if kind not in TASKS:
+        raise ValueError(f'未知的任务类型: {kind}')
+    return Job.objects.create(kind=kind, args=args or {}, created_by=user,
+                              max_attempts=getattr(settings, 'JOBS_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+
+
+def claim(worker_id):
+    """
+    领取一个可以执行的任务：等待中且已到执行时间，或执行中但租约已过期；没有时返回 None
+    """
+    now = timezone.now()
+    candidates = (Job.objects.filter(Q(status=Job.QUEUED, run_after__lte=now)
+                                     | Q(status=Job.RUNNING, locked_until__lt=now))
+                  .order_by('run_after', 'id')
+                  .values_list('id', 'status', 'locked_until', 'attempts', 'max_attempts')[:CLAIM_CANDIDATES])
+    for job_id, status, locked_until, attempts, max_attempts in candidates:
+        # 只有状态和租约没有被其他 worker 改动过时才更新成功
+        unchanged = Job.objects.filter(id=job_id, status=status, locked_until=locked_until)
+        if attempts >= max_attempts:
+            unchanged.update(status=Job.FAILED, error='执行超时，重试次数已用完', finished_at=now,
+                             locked_by='', locked_until=None)
+            continue
+        if unchanged.update(status=Job.RUNNING, locked_by=worker_id, locked_until=now + lease_duration(),
+                            attempts=F('attempts') + 1):
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def report(job, progress, message=''):
+    """
+    汇报进度（百分比）并续租，租约已被其他 worker 接手时抛出 LeaseLost
+    """
+    progress = max(0, min(int(progress), 100))
+    updated = Job.objects.filter(id=job.id, status=Job.RUNNING, locked_by=job.locked_by).update(
+        progress=progress, message=message[:255], locked_until=timezone.now() + lease_duration())
+    if not updated:
+        raise LeaseLost(job.id)
+    job.progress, job.message = progress, message
+
+
+def run_job(job):
+    """
+    执行已领取的任务，根据结果标记为完成、等待重试或失败
+    """
+    owned = Job.objects.filter(id=job.id, status=Job.RUNNING, locked_by=job.locked_by)
+    func = TASKS.get(job.kind)
+    if func is None:
+        owned.update(status=Job.FAILED, error=f'未知的任务类型: {job.kind}', finished_at=timezone.now(),
+                     locked_by='', locked_until=None)
+        return
+    start = time.perf_counter()
+    try:
+        result = func(job, **job.args)
+    except LeaseLost:
+        logger.warning('任务 %s 的租约已被其他 worker 接手，放弃执行', job.id)
+        return
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            backoff = getattr(settings, 'JOBS_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF) * 2 ** (job.attempts - 1)
+            owned.update(status=Job.QUEUED, error=error, run_after=timezone.now() + timedelta(seconds=backoff),
+                         locked_by='', locked_until=None)
+            logger.warning('任务 %s 第 %s 次执行失败，%.0f 秒后重试\n%s', job.id, job.attempts, backoff, error)
+        else:
+            owned.update(status=Job.FAILED, error=error, finished_at=timezone.now(), locked_by='', locked_until=None)
+            logger.error('任务 %s 执行失败\n%s', job.id, error)
+        return
+    owned.update(status=Job.SUCCEEDED, progress=100, result=result, error='', finished_at=timezone.now(),
+                 locked_by='', locked_until=None)
+    logger.info('任务 %s (%s) 完成，用时 %.1f 秒', job.id, job.kind, time.perf_counter() - start)
+
+
+class Worker:
+    def __init__(self, worker_id=None, poll_interval=None):
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        if poll_interval is None:
+            poll_interval = getattr(settings, 'JOBS_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+
+    def run(self, burst=False):
+        """
+        循环领取并执行任务，返回执行的任务数；burst 为 True 时队列为空就返回
+        """
+        processed = 0
+        while not self._stopped.is_set():
+            # 和请求一样，每个任务开始前关闭失效或超时的连接；测试中在事务里运行时不能关闭
+            if not connection.in_atomic_block:
+                close_old_connections()
+            job = claim(self.worker_id)
+            if job is None:
+                if burst:
+                    break
+                self._stopped.wait(self.poll_interval)
+                continue
+            run_job(job)
+            processed += 1
+        return processed
+
+    def stop(self):
+        self._stopped.set()
+
+
+def save_upload(uploaded_file):
+    """
+    把上传的文件保存到 JOBS_UPLOAD_DIR，返回路径，由导入任务读取后删除
+    """
+    os.makedirs(settings.JOBS_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.JOBS_UPLOAD_DIR, f'{uuid.uuid4().hex}.csv')
+    with open(path, 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    return path
+
+
+@task('import_words')
+def import_words_task(job, path, group_id, delete_missing=False):
+    group = WordGroup.objects.get(pk=group_id)
+    size = max(os.path.getsize(path), 1)
+    try:
+        with open(path, 'rb') as f:
+            result = import_words(f, group, delete_missing=delete_missing, progress=lambda result: report(
+                job, f.tell() * 100 // size, f'已写入 {result.imported} 个单词'))
+    except LeaseLost:
+        raise  # 文件由接手的 worker 读取和删除
+    except Exception:
+        # 导入是幂等的，重试时从头再导入一次；不再重试时删除文件
+        if job.attempts >= job.max_attempts:
+            os.remove(path)
+        raise
+    os.remove(path)
+    return {
+        'inserted': result.inserted,
+        'updated': result.updated,
+        'unchanged': result.unchanged,
+        'removed': result.removed,
+        'skipped': result.skipped,
+        'errors': result.errors[:10],
+        'summary': result.summary(),
+    }
+
+
+@task('delete_word_group')
+def delete_word_group_task(job, group_id):
+    hide_group(group_id)
+    result = purge_group(group_id, pause=getattr(settings, 'GROUP_PURGE_PAUSE', 0.0), progress=lambda result: report(
+        job, result.deleted * 100 // max(result.total, 1), f'已删除 {result.deleted}/{result.total} 行'))
+    return {
+        'words': result.words,
+        'records': result.records,
+        'progress': result.progress,
+        'batches': result.batches,
+        'summary': result.summary(),
+    }
+
+
+@task('warm_tts')
+def warm_tts_task(job, group_ids):
+    # 分批合成，每批结束后在同步代码中汇报进度；入队之后单词组可能已被删除，只取未删除的单词组
+    words = list(dict.fromkeys(Word.objects.filter(group_id__in=group_ids, group__deleted_at__isnull=True)
+                               .values_list('word', flat=True)))
+    cache = get_audio_cache()
+    totals = {'total': len(words), 'cached': 0, 'synthesized': 0, 'failed': 0, 'errors': []}
+    for start in range(0, len(words), WARM_BATCH_SIZE):
+        result = asyncio.run(warm(cache, words[start:start + WARM_BATCH_SIZE]))
+        totals['cached'] += result.cached
+        totals['synthesized'] += result.synthesized
+        totals['failed'] += len(result.failed)
+        totals['errors'] = (totals['errors'] + result.failed)[:10]
+        done = min(start + WARM_BATCH_SIZE, len(words))
+        report(job, done * 100 // len(words), f'已处理 {done}/{len(words)} 个单词')
+    return totals
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from wordapp.activity import backfill
+
+
+class Command(BaseCommand):
+    help = '根据历史学习记录重新生成每日学习汇总'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='只处理指定的用户 ID，可重复')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        created = backfill(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已生成 {created} 条每日汇总'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wordapp.bench import ASGI_SCENARIOS, run_asgi
+
+
+class Command(BaseCommand):
+    help = '在进程内直接调用 ASGI 应用，比较不同并发数下的吞吐量（game 和 view_study_records 需要先运行 seed_bench）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f'要运行的场景，默认全部：{", ".join(ASGI_SCENARIOS)}')
+        parser.add_argument('--levels', default='1,8,32', help='逗号分隔的并发数')
+        parser.add_argument('--requests', type=int, default=200, help='每个并发数下的请求数')
+        parser.add_argument('--baseline', action='store_true',
+                            help='同时运行只支持同步调用的 WhiteNoise 中间件（原来的部署方式）作为对比')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or ASGI_SCENARIOS
+        unknown = set(names) - set(ASGI_SCENARIOS)
+        if unknown:
+            raise CommandError(f'未知的场景: {", ".join(sorted(unknown))}')
+        levels = [int(level) for level in options['levels'].split(',')]
+        modes = [('async', False)] + ([('sync', True)] if options['baseline'] else [])
+        self.stdout.write(f'{"mode":<8}{"scenario":<20}{"concurrency":>12}{"req/s":>10}'
+                          f'{"p50_ms":>10}{"p95_ms":>10}{"errors":>8}')
+        for mode, sync_static in modes:
+            try:
+                results = run_asgi(names, levels, options['requests'], sync_static=sync_static)
+            except ValueError as e:
+                raise CommandError(e)
+            for name, level, result in results:
+                row = result.as_dict()
+                self.stdout.write(f'{mode:<8}{name:<20}{level:>12}{row["throughput"]:>10.1f}'
+                                  f'{row["p50_ms"]:>10.1f}{row["p95_ms"]:>10.1f}{row["errors"]:>8}')
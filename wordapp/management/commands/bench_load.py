@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wordapp.bench import Scenarios, run_scenarios
+
+COLUMNS = ('requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'queries', 'throughput')
+
+
+class Command(BaseCommand):
+    help = '在进程内请求各个页面，统计延迟分位数、每个请求的 SQL 次数和吞吐量（需要先运行 seed_bench）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help=f'要运行的场景，默认全部：{", ".join(Scenarios.names)}')
+        parser.add_argument('--requests', type=int, default=200, help='每个场景的请求数')
+        parser.add_argument('--concurrency', type=int, default=1, help='并发线程数')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', help='把结果保存为 JSON 文件')
+        parser.add_argument('--compare', help='与之前保存的 JSON 结果对比')
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(Scenarios.names)
+        if unknown:
+            raise CommandError(f'未知的场景: {", ".join(sorted(unknown))}')
+        try:
+            results = run_scenarios(options['scenarios'] or Scenarios.names, requests=options['requests'],
+                                    concurrency=options['concurrency'], seed=options['seed'])
+        except ValueError as e:
+            raise CommandError(e)
+        data = {name: result.as_dict() for name, result in results.items()}
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        self.stdout.write(f'{"scenario":<20}' + ''.join(f'{column:>12}' for column in COLUMNS))
+        for name, row in data.items():
+            self.stdout.write(f'{name:<20}' + ''.join(
+                f'{row[column]:>12.1f}' if isinstance(row[column], float) else f'{row[column]:>12}'
+                for column in COLUMNS))
+            if name in baseline:
+                old = baseline[name]
+                self.stdout.write(f'{"  vs baseline":<20}' + ''.join(
+                    f'{self.change(old.get(column), row[column]):>12}' for column in COLUMNS))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(data, f, indent=2)
+
+    @staticmethod
+    def change(old, new):
+        if not old:
+            return '-'
+        return f'{(new - old) / old:+.0%}'
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+from django.db.utils import ConnectionHandler
+
+# 对比 Django 自带的 SQLite 配置和 settings 中的配置（PRAGMA、BEGIN IMMEDIATE、SQLITE_BUSY 重试）
+STOCK_PROFILE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {},
+}
+
+
+class Command(BaseCommand):
+    help = '多个线程并发写入临时 SQLite 数据库，对比默认配置和当前配置的吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=16, help='并发写入的线程数')
+        parser.add_argument('--ops', type=int, default=200, help='每个线程的请求数')
+
+    def handle(self, *args, **options):
+        configured = settings.DATABASES['default']
+        profiles = [
+            ('django.db.backends.sqlite3', STOCK_PROFILE),
+            (configured['ENGINE'], {
+                'ENGINE': configured['ENGINE'],
+                'CONN_MAX_AGE': configured.get('CONN_MAX_AGE', 0),
+                'CONN_HEALTH_CHECKS': configured.get('CONN_HEALTH_CHECKS', False),
+                'OPTIONS': configured.get('OPTIONS', {}),
+            }),
+        ]
+        self.stdout.write(f'{options["writers"]} 个线程，每个线程 {options["ops"]} 次请求')
+        for label, profile in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                result = self.run_profile(
+                    {**profile, 'NAME': os.path.join(directory, 'bench.sqlite3')},
+                    options['writers'], options['ops'])
+            self.stdout.write(
+                f'{label}: 成功 {result["ok"]}，失败 {result["failed"]}，'
+                f'用时 {result["elapsed"]:.2f} 秒，{result["ok"] / result["elapsed"]:.0f} 次/秒')
+
+    def run_profile(self, profile, writers, ops):
+        handler = ConnectionHandler({'default': profile})
+        with handler['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE record (id INTEGER PRIMARY KEY, user_id INTEGER, '
+                           'word_id INTEGER, timestamp REAL)')
+            cursor.execute('CREATE INDEX record_user ON record (user_id, timestamp)')
+        handler['default'].close()
+
+        counts = {'ok': 0, 'failed': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(writers)
+
+        def writer(user_id):
+            ok = failed = 0
+            barrier.wait()
+            for i in range(ops):
+                # 模拟一次答题请求：写一条记录，再读最近的记录
+                connection = handler['default']
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute('INSERT INTO record (user_id, word_id, timestamp) VALUES (%s, %s, %s)',
+                                       [user_id, i, time.time()])
+                        cursor.execute('SELECT word_id FROM record WHERE user_id = %s '
+                                       'ORDER BY timestamp DESC LIMIT 10', [user_id])
+                        cursor.fetchall()
+                    ok += 1
+                except DatabaseError:
+                    failed += 1
+                # 与请求结束时的处理相同，按 CONN_MAX_AGE 决定是否关闭连接
+                connection.close_if_unusable_or_obsolete()
+            handler['default'].close()
+            with lock:
+                counts['ok'] += ok
+                counts['failed'] += failed
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts['elapsed'] = time.perf_counter() - start
+        return counts
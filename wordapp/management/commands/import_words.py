@@ -0,0 +1,41 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wordapp.importer import DEFAULT_CHUNK_SIZE, import_words
+from wordapp.models import WordGroup
+
+
+class Command(BaseCommand):
+    help = '从 CSV 文件批量导入单词，适合网页上传过大的词库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV 文件路径，每行格式为 单词,释义')
+        parser.add_argument('--group', help='单词组名称，默认使用文件名')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='每个事务写入的行数')
+        parser.add_argument('--delete-missing', action='store_true',
+                            help='删除单词组中文件里没有的单词')
+
+    def handle(self, *args, **options):
+        path = options['csv_path']
+        if not os.path.isfile(path):
+            raise CommandError(f'文件不存在: {path}')
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size 必须大于 0')
+
+        group_name = options['group'] or os.path.splitext(os.path.basename(path))[0]
+        group, created = WordGroup.objects.visible().get_or_create(name=group_name)
+
+        def progress(result):
+            self.stdout.write(f'已导入 {result.imported} 行（{result.rows_per_second:.0f} 行/秒）')
+
+        with open(path, 'rb') as f:
+            result = import_words(f, group, chunk_size=options['chunk_size'], progress=progress,
+                                  delete_missing=options['delete_missing'])
+
+        for line_number, reason in result.errors:
+            self.stderr.write(f'第 {line_number} 行: {reason}')
+        if result.skipped > len(result.errors):
+            self.stderr.write(f'……另有 {result.skipped - len(result.errors)} 行错误未列出')
+        self.stdout.write(self.style.SUCCESS(f'{group.name}: {result.summary()}'))
@@ -0,0 +1,39 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wordapp.models import Word, WordGroup
+from wordapp.tts_cache import get_audio_cache, warm
+
+
+class Command(BaseCommand):
+    help = '为整个单词组预先生成 TTS 语音，已缓存的单词会被跳过'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, required=True, help='单词组 ID')
+        parser.add_argument('--concurrency', type=int, default=4, help='同时合成的数量')
+        parser.add_argument('--retries', type=int, default=3, help='每个单词失败后的重试次数')
+        parser.add_argument('--backoff', type=float, default=0.5, help='首次重试前等待的秒数')
+
+    def handle(self, *args, **options):
+        try:
+            group = WordGroup.objects.visible().get(pk=options['group'])
+        except WordGroup.DoesNotExist:
+            raise CommandError(f'单词组不存在: {options["group"]}')
+        if options['concurrency'] <= 0:
+            raise CommandError('--concurrency 必须大于 0')
+
+        words = list(Word.objects.filter(group=group).values_list('word', flat=True))
+
+        def progress(result):
+            self.stdout.write(f'\r{result.done}/{result.total}（{result.per_second:.1f} 个/秒）', ending='')
+            self.stdout.flush()
+
+        result = asyncio.run(warm(
+            get_audio_cache(), words, concurrency=options['concurrency'],
+            retries=options['retries'], backoff=options['backoff'], progress=progress))
+
+        self.stdout.write('')
+        for text, reason in result.failed:
+            self.stderr.write(f'{text}: {reason}')
+        self.stdout.write(self.style.SUCCESS(f'{group.name}: {result.summary()}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from wordapp.counters import recount_groups, recount_progress
+
+
+class Command(BaseCommand):
+    help = '重新计算单词组的单词数和学习进度的剩余单词数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', dest='groups',
+                            help='只处理指定的单词组 ID，可重复')
+
+    def handle(self, *args, **options):
+        groups = recount_groups(options['groups'])
+        progress = recount_progress(options['groups'])
+        self.stdout.write(self.style.SUCCESS(f'修正了 {groups} 个单词组和 {progress} 条学习进度'))
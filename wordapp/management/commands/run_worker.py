@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wordapp.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = '执行后台任务（导入、删除单词组、预生成语音），可以同时运行多个进程'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--burst', action='store_true', help='队列为空时退出，而不是继续等待新任务')
+        parser.add_argument('--poll-interval', type=float, help='队列为空时每隔多少秒检查一次')
+        parser.add_argument('--worker-id', help='写入任务租约的 worker 名称，默认为 主机名:进程号')
+
+    def handle(self, *args, **options):
+        if options['poll_interval'] is not None and options['poll_interval'] <= 0:
+            raise CommandError('--poll-interval 必须大于 0')
+        worker = Worker(options['worker_id'], options['poll_interval'])
+
+        def stop(signum, frame):
+            # 执行完当前任务再退出
+            self.stdout.write('正在停止，等待当前任务完成')
+            worker.stop()
+
+        previous = {signum: signal.signal(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        self.stdout.write(f'worker {worker.worker_id} 已启动')
+        try:
+            processed = worker.run(burst=options['burst'])
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f'共执行 {processed} 个任务'))
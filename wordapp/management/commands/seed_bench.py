@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from wordapp.bench import STAFF_USERNAME, clear, seed
+
+
+class Command(BaseCommand):
+    help = '按随机种子生成压测用的用户、单词组、学习记录和学习进度'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--words-per-group', type=int, default=100)
+        parser.add_argument('--records', type=int, default=1_000_000)
+        parser.add_argument('--progress-per-user', type=int, default=3)
+        parser.add_argument('--clear', action='store_true', help='先删除以前生成的测试数据')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear()
+        elif User.objects.filter(username=STAFF_USERNAME).exists():
+            raise CommandError('已经有测试数据，使用 --clear 重新生成')
+
+        def progress(result):
+            self.stdout.write(f'\r学习记录 {result.records}/{options["records"]}', ending='')
+            self.stdout.flush()
+
+        result = seed(options['seed'], users=options['users'], groups=options['groups'],
+                      words_per_group=options['words_per_group'], records=options['records'],
+                      progress_per_user=options['progress_per_user'], progress=progress)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(result.summary()))
@@ -0,0 +1,230 @@
+"""
+Prometheus 文本格式的运行指标
+
+请求路径上只更新当前线程自己的计数（无锁），抓取 /metrics 时再合并所有线程。
+配置了 METRICS_DIR 时，每个进程每隔 METRICS_DUMP_INTERVAL 秒把自己的计数写入
+该目录下的 <pid>.json，抓取时汇总目录中所有进程的数据，适用于多个 worker 进程。
+"""
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_DUMP_INTERVAL = 10.0
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._local = threading.local()
+        self._shards = []  # 每个线程一个 {(指标名, 标签值): 数值}
+        self._lock = threading.Lock()
+        self._next_dump = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def collect(self):
+        """
+        合并本进程所有线程的数据
+        """
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            for key, value in shard.copy().items():
+                merged[key] = merge(merged.get(key), value)
+        return merged
+
+    def dump(self):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        data = [[name, list(labels), value] for (name, labels), value in self.collect().items()]
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(directory, f'{os.getpid()}.json'))
+
+    def maybe_dump(self):
+        now = time.monotonic()
+        if now >= self._next_dump:
+            self._next_dump = now + getattr(settings, 'METRICS_DUMP_INTERVAL', DEFAULT_DUMP_INTERVAL)
+            self.dump()
+
+    def collect_all(self):
+        """
+        合并所有进程的数据；没有配置 METRICS_DIR 时只有本进程
+        """
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return self.collect()
+        self.dump()
+        merged = {}
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # 正在被替换或已损坏
+            for metric_name, labels, value in data:
+                key = (metric_name, tuple(labels))
+                merged[key] = merge(merged.get(key), value)
+        return merged
+
+    def render(self):
+        samples = self.collect_all()
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+
+def merge(total, value):
+    if total is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(total, value)]
+    return total + value
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+
+    def samples(self, samples):
+        return sorted((labels, value) for (name, labels), value in samples.items() if name == self.name)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def render(self, samples):
+        lines = self.header()
+        for labels, value in self.samples(samples):
+            lines.append(f'{self.name}{format_labels(zip(self.labelnames, labels))} {value}')
+        return lines
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(name, documentation, labelnames, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self.registry.shard()
+        key = (self.name, labels)
+        data = shard.get(key)
+        if data is None:
+            # 各个桶的数量（最后一个是 +Inf），然后是总和与次数
+            data = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self, samples):
+        lines = self.header()
+        for labels, data in self.samples(samples):
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), data):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(pairs + [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(pairs)} {data[-2]}')
+            lines.append(f'{self.name}_count{format_labels(pairs)} {data[-1]}')
+        return lines
+
+
+class Ratio(Metric):
+    """
+    抓取时由两个计数器算出的比值，分母为 0 时不输出
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, numerator, denominator, **kwargs):
+        super().__init__(name, documentation, **kwargs)
+        self.numerator = numerator
+        self.denominator = denominator
+
+    def render(self, samples):
+        numerator = sum(value for key, value in samples.items() if self.numerator(key))
+        denominator = sum(value for key, value in samples.items() if self.denominator(key))
+        if not denominator:
+            return []
+        return self.header() + [f'{self.name} {numerator / denominator}']
+
+
+REQUEST_LATENCY = Histogram('lexiq_request_duration_seconds', '请求耗时', ['view'])
+REQUESTS = Counter('lexiq_requests_total', '请求数', ['view', 'status'])
+DB_QUERIES = Counter('lexiq_db_queries_total', 'SQL 查询数', ['view'])
+TTS_SYNTHESIS = Histogram('lexiq_tts_synthesis_seconds', '语音合成耗时')
+TTS_FAILURES = Counter('lexiq_tts_synthesis_failures_total', '语音合成失败次数')
+TTS_CACHE = Counter('lexiq_tts_cache_requests_total', '语音缓存请求数', ['result'])
+TTS_CACHE_HIT_RATIO = Ratio(
+    'lexiq_tts_cache_hit_ratio', '语音缓存命中率',
+    numerator=lambda key: key == (TTS_CACHE.name, ('hit',)),
+    denominator=lambda key: key[0] == TTS_CACHE.name)
+IMPORT_ROWS = Counter('lexiq_csv_import_rows_total', 'CSV 导入的行数', ['result'])
+IMPORT_SECONDS = Counter('lexiq_csv_import_seconds_total', 'CSV 导入用时')
+IMPORT_THROUGHPUT = Ratio(
+    'lexiq_csv_import_rows_per_second', 'CSV 导入速度（行/秒）',
+    numerator=lambda key: key[0] == IMPORT_ROWS.name,
+    denominator=lambda key: key[0] == IMPORT_SECONDS.name)
+
+
+def observe_request(view_name, status, duration, sql_count):
+    REQUEST_LATENCY.observe(duration, view_name)
+    REQUESTS.inc(view_name, str(status))
+    DB_QUERIES.inc(view_name, amount=sql_count)
+    REGISTRY.maybe_dump()
+
+
+atexit.register(REGISTRY.dump)
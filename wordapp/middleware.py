@@ -0,0 +1,167 @@
+import cProfile
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, perf
+from .profiling import save_profile
+
+logger = logging.getLogger('wordapp.perf')
+
+DEFAULT_SLOW_REQUEST_MS = 500
+
+
+class PerformanceMiddleware:
+    """
+    统计每个请求的总耗时、SQL 次数和耗时、模板渲染和语音合成耗时，
+    写入 Server-Timing 响应头，超过 PERF_SLOW_REQUEST_MS 的请求连同最慢的 SQL 记入日志
+
+    同时支持同步和异步调用，应放在 MIDDLEWARE 的最前面
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = perf.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            perf.end(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = perf.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            perf.end(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = timings.elapsed
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else '-'
+        server_timing = [f'view;desc="{view_name}"', f'total;dur={total * 1000:.1f}',
+                         f'db;dur={timings.sql_time * 1000:.1f};desc="{timings.sql_count} queries"']
+        server_timing += [f'{name};dur={duration * 1000:.1f}' for name, duration in timings.durations.items()]
+        response['Server-Timing'] = ', '.join(server_timing)
+        metrics.observe_request(view_name, response.status_code, total, timings.sql_count)
+
+        threshold = getattr(settings, 'PERF_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS)
+        if threshold is not None and total * 1000 >= threshold:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, %s\n%s',
+                request.method, request.path, view_name,
+                total * 1000, timings.sql_count, timings.sql_time * 1000,
+                ', '.join(f'{name} {duration * 1000:.0f} ms' for name, duration in timings.durations.items()),
+                '\n'.join(f'  {duration * 1000:.1f} ms  {sql}' for duration, sql in timings.slowest_queries()))
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    按需用 cProfile 剖析单个请求，见 profiling 模块
+
+    没有开启 PROFILING_ENABLED 时不会被加载，没有任何开销；
+    需要放在 AuthenticationMiddleware 之后。同时支持同步和异步调用，异步视图不会被转成同步调用。
+    异步请求在事件循环的线程中剖析，同一时刻只剖析一个请求，结果中也会包含同时在运行的其他协程
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.profiling = False  # 事件循环中是否已经有请求在剖析
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def requested(self, request):
+        return bool(request.GET.get('profile') or request.headers.get('X-Profile'))
+
+    def sampled(self):
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not (self.requested(request) and request.user.is_staff) and not self.sampled():
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        name = save_profile(profiler, self.view_name(request), time.perf_counter() - start)
+        if request.user.is_staff:
+            response['X-Profile'] = name
+        return response
+
+    async def __acall__(self, request):
+        # 只有请求剖析时才需要在线程中解析 request.user
+        is_staff = self.requested(request) and await sync_to_async(lambda: request.user.is_staff)()
+        if self.profiling or not (is_staff or self.sampled()):
+            return await self.get_response(request)
+        self.profiling = True
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profiler.disable()
+            self.profiling = False
+        name = await sync_to_async(save_profile, thread_sensitive=False)(
+            profiler, self.view_name(request), time.perf_counter() - start)
+        if is_staff:
+            response['X-Profile'] = name
+        return response
+
+    def view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else 'unknown'
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    同时支持同步和异步调用的 WhiteNoiseMiddleware
+
+    WhiteNoise 6 的中间件只支持同步调用，放在 ASGI 下的中间件链中会让之后的
+    所有视图（包括异步视图）都被转成同步调用
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,69 @@
+from array import array
+import random
+import sys
+
+from django.db import migrations, models
+
+
+def pack_ids(ids):
+    packed = array('q', ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ids(data):
+    ids = array('q')
+    ids.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    return ids.tolist()
+
+
+def copy_words_to_queue(apps, schema_editor):
+    # 把多对多表中剩余未学的单词打乱后写入队列
+    StudyProgress = apps.get_model('wordapp', 'StudyProgress')
+    Through = StudyProgress.words_to_learn.through
+    remaining = {}
+    for progress_id, word_id in Through.objects.values_list('studyprogress_id', 'word_id').iterator():
+        remaining.setdefault(progress_id, []).append(word_id)
+    for progress in StudyProgress.objects.only('id').iterator():
+        ids = remaining.get(progress.id, [])
+        random.shuffle(ids)
+        StudyProgress.objects.filter(pk=progress.pk).update(queue=pack_ids(ids), cursor=0)
+
+
+def copy_queue_to_words(apps, schema_editor):
+    StudyProgress = apps.get_model('wordapp', 'StudyProgress')
+    Word = apps.get_model('wordapp', 'Word')
+    Through = StudyProgress.words_to_learn.through
+    rows = []
+    for progress in StudyProgress.objects.only('id', 'queue', 'cursor').iterator():
+        ids = unpack_ids(progress.queue)[progress.cursor:]
+        for word_id in Word.objects.filter(id__in=ids).values_list('id', flat=True):
+            rows.append(Through(studyprogress_id=progress.id, word_id=word_id))
+    Through.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0005_alter_studyprogress_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="studyprogress",
+            name="queue",
+            field=models.BinaryField(default=b""),
+        ),
+        migrations.AddField(
+            model_name="studyprogress",
+            name="cursor",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(copy_words_to_queue, copy_queue_to_words),
+        migrations.RemoveField(
+            model_name="studyprogress",
+            name="words_to_learn",
+        ),
+    ]
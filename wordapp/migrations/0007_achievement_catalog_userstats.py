@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+ACHIEVEMENTS = [
+    ("千里之行", "学习1个单词"),
+    ("拾级而上", "学习10个单词"),
+    ("积少成多", "学习100个单词"),
+    ("词汇大师", "学习500个单词"),
+    ("学富五车", "学习1000个单词"),
+    ("心如明镜", "连续学习30天"),
+    ("清风明月", "连续学习60天"),
+    ("博闻强识", "在一周内学50个单词"),
+]
+
+
+def seed_catalog(apps, schema_editor):
+    # 以前每次发放成就都会新建一条 Achievement，这里合并成每个名称一条
+    Achievement = apps.get_model('wordapp', 'Achievement')
+    UserAchievement = apps.get_model('wordapp', 'UserAchievement')
+    descriptions = dict(ACHIEVEMENTS)
+    names = set(Achievement.objects.values_list('name', flat=True)) | set(descriptions)
+    for name in names:
+        rows = list(Achievement.objects.filter(name=name).order_by('id'))
+        if rows:
+            canonical = rows[0]
+        else:
+            canonical = Achievement.objects.create(name=name, description=descriptions[name])
+        duplicates = [row.id for row in rows[1:]]
+        if duplicates:
+            UserAchievement.objects.filter(achievement_id__in=duplicates).update(achievement=canonical)
+            Achievement.objects.filter(id__in=duplicates).delete()
+        # 每个用户同一成就只保留最早的一条
+        seen = set()
+        for user_achievement in UserAchievement.objects.filter(
+                achievement=canonical).order_by('achieved_at', 'id'):
+            if user_achievement.user_id in seen:
+                user_achievement.delete()
+            else:
+                seen.add(user_achievement.user_id)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("wordapp", "0006_studyprogress_queue"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_catalog, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="achievement",
+            name="name",
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_records", models.PositiveIntegerField(default=0)),
+                ("current_streak", models.PositiveIntegerField(default=0)),
+                ("longest_streak", models.PositiveIntegerField(default=0)),
+                ("last_study_date", models.DateField(blank=True, null=True)),
+                ("recent_counts", models.JSONField(default=dict)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
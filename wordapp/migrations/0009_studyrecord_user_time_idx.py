@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0008_dailyactivity"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="studyrecord",
+            index=models.Index(
+                fields=["user", "-timestamp", "-id"], name="studyrecord_user_time_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.10 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    # 加唯一约束前删除重复行：学习进度保留学得最多的一条，成就保留最早的一条
+    StudyProgress = apps.get_model("wordapp", "StudyProgress")
+    UserAchievement = apps.get_model("wordapp", "UserAchievement")
+    for model, key, order in [
+        (StudyProgress, ("user_id", "word_group_id"), ("-cursor", "id")),
+        (UserAchievement, ("user_id", "achievement_id"), ("achieved_at", "id")),
+    ]:
+        seen = set()
+        duplicates = []
+        for row in model.objects.order_by(*key, *order).values("id", *key):
+            pair = tuple(row[field] for field in key)
+            if pair in seen:
+                duplicates.append(row["id"])
+            else:
+                seen.add(pair)
+        for start in range(0, len(duplicates), 500):
+            model.objects.filter(id__in=duplicates[start : start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0009_studyrecord_user_time_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="word",
+            index=models.Index(fields=["group", "word"], name="word_group_word_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="studyprogress",
+            constraint=models.UniqueConstraint(
+                fields=("user", "word_group"), name="unique_study_progress"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="userachievement",
+            constraint=models.UniqueConstraint(
+                fields=("user", "achievement"), name="unique_user_achievement"
+            ),
+        ),
+    ]
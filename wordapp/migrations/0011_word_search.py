@@ -0,0 +1,60 @@
+# Generated by Django 4.2.10 on 2026-10-18 21:02
+
+from django.db import migrations, models
+
+# 单词的全文索引：trigram 分词支持任意位置的子串匹配，
+# 外部内容表不重复保存数据，由触发器随 wordapp_word 的增删改同步
+CREATE_FTS = [
+    "CREATE VIRTUAL TABLE wordapp_word_fts USING fts5("
+    "word, meaning, content='wordapp_word', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER wordapp_word_fts_insert AFTER INSERT ON wordapp_word BEGIN "
+    "INSERT INTO wordapp_word_fts(rowid, word, meaning) VALUES (new.id, new.word, new.meaning); "
+    "END",
+    "CREATE TRIGGER wordapp_word_fts_delete AFTER DELETE ON wordapp_word BEGIN "
+    "INSERT INTO wordapp_word_fts(wordapp_word_fts, rowid, word, meaning) "
+    "VALUES ('delete', old.id, old.word, old.meaning); "
+    "END",
+    "CREATE TRIGGER wordapp_word_fts_update AFTER UPDATE OF word, meaning ON wordapp_word BEGIN "
+    "INSERT INTO wordapp_word_fts(wordapp_word_fts, rowid, word, meaning) "
+    "VALUES ('delete', old.id, old.word, old.meaning); "
+    "INSERT INTO wordapp_word_fts(rowid, word, meaning) VALUES (new.id, new.word, new.meaning); "
+    "END",
+    "INSERT INTO wordapp_word_fts(wordapp_word_fts) VALUES ('rebuild')",
+]
+DROP_FTS = [
+    "DROP TRIGGER IF EXISTS wordapp_word_fts_insert",
+    "DROP TRIGGER IF EXISTS wordapp_word_fts_delete",
+    "DROP TRIGGER IF EXISTS wordapp_word_fts_update",
+    "DROP TABLE IF EXISTS wordapp_word_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    # 只有 SQLite 有 FTS5，其他数据库的搜索退回到 LIKE 查询
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in CREATE_FTS:
+            schema_editor.execute(sql)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in DROP_FTS:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0010_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="word",
+            index=models.Index(fields=["word"], name="word_word_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="word",
+            index=models.Index(fields=["meaning"], name="word_meaning_idx"),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.10 on 2026-10-18 21:40
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+# 在 SQLite 上添加或删除约束会重建 wordapp_word 表，表上的触发器随旧表一起被删除，
+# 重建后需要重新创建 0011 中的全文索引触发器；rowid 在重建时保持不变，索引内容无需重建
+CREATE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS wordapp_word_fts_insert AFTER INSERT ON wordapp_word BEGIN "
+    "INSERT INTO wordapp_word_fts(rowid, word, meaning) VALUES (new.id, new.word, new.meaning); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS wordapp_word_fts_delete AFTER DELETE ON wordapp_word BEGIN "
+    "INSERT INTO wordapp_word_fts(wordapp_word_fts, rowid, word, meaning) "
+    "VALUES ('delete', old.id, old.word, old.meaning); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS wordapp_word_fts_update AFTER UPDATE OF word, meaning ON wordapp_word BEGIN "
+    "INSERT INTO wordapp_word_fts(wordapp_word_fts, rowid, word, meaning) "
+    "VALUES ('delete', old.id, old.word, old.meaning); "
+    "INSERT INTO wordapp_word_fts(rowid, word, meaning) VALUES (new.id, new.word, new.meaning); "
+    "END",
+]
+
+
+def create_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for sql in CREATE_TRIGGERS:
+            schema_editor.execute(sql)
+
+
+def merge_duplicates(apps, schema_editor):
+    # 同一组内重复的单词合并到 id 最小的一行，释义取最后上传的一行，学习记录改为指向保留的行
+    Word = apps.get_model("wordapp", "Word")
+    StudyRecord = apps.get_model("wordapp", "StudyRecord")
+    duplicates = list(
+        Word.objects.values("group_id", "word")
+        .annotate(count=Count("id"), keep=Min("id"), latest=Max("id"))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        meaning = Word.objects.values_list("meaning", flat=True).get(id=row["latest"])
+        Word.objects.filter(id=row["keep"]).update(meaning=meaning)
+        others = Word.objects.filter(
+            group_id=row["group_id"], word=row["word"]
+        ).exclude(id=row["keep"])
+        StudyRecord.objects.filter(word__in=others).update(word_id=row["keep"])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0011_word_search"),
+    ]
+
+    operations = [
+        # 回滚时最后执行，恢复 RemoveConstraint 重建表时删除的触发器
+        migrations.RunPython(migrations.RunPython.noop, create_triggers),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="word",
+            name="word_group_word_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="word",
+            constraint=models.UniqueConstraint(
+                fields=("group", "word"), name="unique_group_word"
+            ),
+        ),
+        migrations.RunPython(create_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0013_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wordgroup",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
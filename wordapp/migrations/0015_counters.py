@@ -0,0 +1,44 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:10
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Length
+
+ID_SIZE = 8
+
+
+def backfill(apps, schema_editor):
+    WordGroup = apps.get_model("wordapp", "WordGroup")
+    Word = apps.get_model("wordapp", "Word")
+    StudyProgress = apps.get_model("wordapp", "StudyProgress")
+    counts = (
+        Word.objects.filter(group=OuterRef("pk"))
+        .order_by()
+        .values("group")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    WordGroup.objects.update(
+        word_count=Coalesce(Subquery(counts), Value(0), output_field=models.IntegerField())
+    )
+    StudyProgress.objects.update(remaining=Length("queue") / ID_SIZE - F("cursor"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0014_wordgroup_deleted_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="studyprogress",
+            name="remaining",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="wordgroup",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("wordapp", "0015_counters"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="wordgroup",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,9 +1,26 @@
-from django.db import models
+from array import array
+from datetime import timedelta
+import random
+import sys
+
+from asgiref.sync import sync_to_async
+from django.db import connection, models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class WordGroupQuerySet(models.QuerySet):
+    def visible(self):
+        # 正在删除的单词组不再显示，见 purge.py
+        return self.filter(deleted_at__isnull=True)
 
 
 class WordGroup(models.Model):
     name = models.CharField(max_length=100)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)  # 已标记删除，等待后台任务分批清除
+    word_count = models.PositiveIntegerField(default=0)  # 由导入和删除单词时维护，recount 命令可以修正
+
+    objects = WordGroupQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -16,6 +33,16 @@ class Word(models.Model):
 
     class Meta:
         app_label = 'wordapp'
+        constraints = [
+            # 重复上传同一个 CSV 时按 (group, word) 更新而不是追加，见 importer.py；
+            # 约束的索引同时用于按单词组取单词（预生成语音、导入查重）时不用回表
+            models.UniqueConstraint(fields=['group', 'word'], name='unique_group_word'),
+        ]
+        indexes = [
+            # 搜索时少于三个字符的查询按前缀查找，见 search.py
+            models.Index(fields=['word'], name='word_word_idx'),
+            models.Index(fields=['meaning'], name='word_meaning_idx'),
+        ]
 
     def __str__(self):
         return self.word
@@ -26,49 +53,165 @@ class StudyRecord(models.Model):
     word = models.ForeignKey(Word, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # 学习记录页按 (timestamp, id) 倒序分页
+            models.Index(fields=['user', '-timestamp', '-id'], name='studyrecord_user_time_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.word.word} - {self.timestamp}"
 
 
+def pack_ids(ids):
+    """
+    把单词 id 列表打包成小端 8 字节整数的二进制串
+    """
+    packed = array('q', ids)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ids(data):
+    ids = array('q')
+    ids.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    return ids.tolist()
+
+
 class StudyProgress(models.Model):
+    ID_SIZE = 8  # 队列中每个单词 id 占用的字节数
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     word_group = models.ForeignKey(WordGroup, on_delete=models.CASCADE)
-    words_to_learn = models.ManyToManyField(
-        Word, related_name='words_to_learn')
+    # 打乱顺序后的单词 id，cursor 之前的是本轮已经学过的
+    queue = models.BinaryField(default=b'')
+    cursor = models.PositiveIntegerField(default=0)
+    remaining = models.PositiveIntegerField(default=0)  # 队列中 cursor 之后的单词数，显示进度时不用读取 queue
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'word_group'], name='unique_study_progress'),
+        ]
 
     def __str__(self):
-        words_learned_count = self.words_to_learn.count()
-        # 获取 word_group 中单词的总数量
-        total_words_count = self.word_group.words.count()
-        # 计算学习进度（已学单词数量除以总单词数量）
-        progress = words_learned_count / total_words_count if total_words_count != 0 else 0
-        # 格式化输出
-        return f"{self.user.username} - {self.word_group.name} Progress: {progress:.2%}"
-
-    def create_progress(self):
+        return f"{self.user.username} - {self.word_group.name} Progress: {self.progress:.2%}"
+
+    @property
+    def learned(self):
+        # 本轮已学的单词数
+        return self.cursor
+
+    @property
+    def progress(self):
+        # 本轮已学单词数量除以本轮总单词数量
+        total = self.learned + self.remaining
+        return self.learned / total if total else 0
+
+    @property
+    def word_ids(self):
+        return unpack_ids(self.queue)
+
+    def reset_progress(self, defer=()):
+        """
+        重置学习进度，把单词组中的所有单词打乱后重新排队，defer 中的单词排在最后
+        """
+        ids = list(Word.objects.filter(group_id=self.word_group_id).values_list('id', flat=True))
+        random.shuffle(ids)
+        if defer:
+            defer = set(defer)
+            ids = [i for i in ids if i not in defer] + [i for i in ids if i in defer]
+        self.queue = pack_ids(ids)
+        self.cursor = 0
+        self.remaining = len(ids)
+        self.save(update_fields=['queue', 'cursor', 'remaining'])
+
+    def pop_word_id(self):
+        """
+        原子地取出队列中的下一个单词 id，本轮已学完时返回 None
+
+        只执行一条 UPDATE ... RETURNING，两个标签页同时取词也不会取到同一个
+        """
+        table = connection.ops.quote_name(self._meta.db_table)
+        cursor_column = connection.ops.quote_name('cursor')
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(
+                f'UPDATE {table} SET {cursor_column} = {cursor_column} + 1, '
+                f'remaining = length(queue) / %s - {cursor_column} - 1 '
+                f'WHERE id = %s AND {cursor_column} < length(queue) / %s '
+                f'RETURNING {cursor_column}, remaining, substr(queue, ({cursor_column} - 1) * %s + 1, %s)',
+                [self.ID_SIZE, self.pk, self.ID_SIZE, self.ID_SIZE, self.ID_SIZE])
+            row = db_cursor.fetchone()
+        if row is None:
+            return None
+        self.cursor, self.remaining, packed = row
+        return unpack_ids(packed)[0]
+
+    def pop_word_ids(self, count):
+        """
+        原子地取出最多 count 个单词 id，本轮已学完时返回空列表
+        """
+        while True:
+            size = len(self.queue) // self.ID_SIZE
+            start = self.cursor
+            if start >= size:
+                return []
+            end = min(start + count, size)
+            # 只有 cursor 没被其他请求改动过时才更新成功
+            if StudyProgress.objects.filter(pk=self.pk, cursor=start).update(cursor=end, remaining=size - end):
+                self.cursor = end
+                self.remaining = size - end
+                return unpack_ids(self.queue[start * self.ID_SIZE:end * self.ID_SIZE])
+            self.refresh_from_db(fields=['queue', 'cursor', 'remaining'])
+
+    def next_words(self, count):
         """
-        创建学习进度，将单词组中的所有单词添加到学习进度中
+        一次取出 count 个要学的单词，本轮不够时开始新的一轮
         """
-        words = Word.objects.filter(group=self.word_group)
-        for word in words:
-            self.words_to_learn.add(word)
+        ids = self.pop_word_ids(count)
+        if len(ids) < count:
+            # 本轮剩下的单词排到新一轮最后，同一批里不会出现重复
+            self.reset_progress(defer=ids)
+            taken = set(ids)
+            ids += [word_id for word_id in self.pop_word_ids(count - len(ids)) if word_id not in taken]
+        words = Word.objects.in_bulk(ids)
+        return [words[word_id] for word_id in ids if word_id in words]
 
-    def remove_word(self, word):
+    def next_word(self):
         """
-        从学习进度中删除单词
+        取出下一个要学的单词，一轮学完后重新打乱开始下一轮；单词组为空时返回 None
         """
-        self.words_to_learn.remove(word)
+        for round_ in range(2):
+            word_id = self.pop_word_id()
+            while word_id is not None:
+                word = Word.objects.filter(pk=word_id).first()
+                if word is not None:
+                    return word
+                word_id = self.pop_word_id()  # 单词已被删除，跳过
+            if round_ == 0:
+                self.reset_progress()
+        return None
 
-    def reset_progress(self):
+    async def anext_word(self):
         """
-        重置学习进度，将单词组中的所有单词重新添加到学习进度中
+        next_word 的异步版本，取词的 UPDATE ... RETURNING 仍在线程中执行
         """
-        self.words_to_learn.clear()
-        self.create_progress()
+        for round_ in range(2):
+            word_id = await sync_to_async(self.pop_word_id)()
+            while word_id is not None:
+                word = await Word.objects.filter(pk=word_id).afirst()
+                if word is not None:
+                    return word
+                word_id = await sync_to_async(self.pop_word_id)()
+            if round_ == 0:
+                await sync_to_async(self.reset_progress)()
+        return None
 
 
 class Achievement(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
     description = models.TextField()
 
     def __str__(self):
@@ -80,5 +223,113 @@ class UserAchievement(models.Model):
     achievement = models.ForeignKey(Achievement, on_delete=models.CASCADE)
     achieved_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'achievement'], name='unique_user_achievement'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.achievement.name}"
+
+
+class UserStats(models.Model):
+    """
+    每个用户的学习统计，写入学习记录时增量更新，用于发放成就
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
+    total_records = models.PositiveIntegerField(default=0)
+    current_streak = models.PositiveIntegerField(default=0)  # 截至 last_study_date 的连续学习天数
+    longest_streak = models.PositiveIntegerField(default=0)
+    last_study_date = models.DateField(null=True, blank=True)
+    recent_counts = models.JSONField(default=dict)  # 最近一周每天的学习数量 {'2024-03-09': 12}
+
+    WEEK_DAYS = 7
+
+    def __str__(self):
+        return f"{self.user.username} - {self.total_records}"
+
+    def record(self, day, count=1):
+        """
+        记入 day 这一天新学的 count 个单词，不保存
+        """
+        self.total_records += count
+        if self.last_study_date is None or day > self.last_study_date:
+            if self.last_study_date is not None and day - self.last_study_date == timedelta(days=1):
+                self.current_streak += 1
+            else:
+                self.current_streak = 1
+            self.last_study_date = day
+            self.longest_streak = max(self.longest_streak, self.current_streak)
+        key = day.isoformat()
+        self.recent_counts[key] = self.recent_counts.get(key, 0) + count
+        # 只保留最近一周的数据
+        oldest = (self.last_study_date - timedelta(days=self.WEEK_DAYS - 1)).isoformat()
+        self.recent_counts = {d: n for d, n in self.recent_counts.items() if d >= oldest}
+
+    def words_in_week(self, today):
+        oldest = (today - timedelta(days=self.WEEK_DAYS - 1)).isoformat()
+        today = today.isoformat()
+        return sum(n for d, n in self.recent_counts.items() if oldest <= d <= today)
+
+
+class DailyActivity(models.Model):
+    """
+    每个用户每天的学习汇总，写入学习记录时更新
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    words_studied = models.PositiveIntegerField(default=0)
+    distinct_words = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_activity'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date} - {self.words_studied}"
+
+
+class Job(models.Model):
+    """
+    后台任务，由 run_worker 进程领取执行，见 jobs.py
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, '等待中'),
+        (RUNNING, '执行中'),
+        (SUCCEEDED, '已完成'),
+        (FAILED, '失败'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    args = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # 百分比
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)  # 重试时推迟到退避结束
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)  # 租约到期后其他 worker 可以接手
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # worker 按 (status, run_after) 查找可领取的任务
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} - {self.status}"
+
+    @property
+    def finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
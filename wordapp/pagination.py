@@ -0,0 +1,66 @@
+"""
+基于 (timestamp, id) 的游标分页
+
+不使用 OFFSET，翻到多深的页都只读取一页的数据。
+"""
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(timestamp, pk):
+    raw = f'{timestamp.isoformat()}|{pk}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析游标，无法识别时返回 None
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        timestamp, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if timestamp is None:
+        return None
+    return timestamp, pk
+
+
+def page_queryset(queryset, cursor, page_size, field='timestamp'):
+    position = decode_cursor(cursor)
+    if position is not None:
+        timestamp, pk = position
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk}))
+    return queryset.order_by(f'-{field}', '-id')[:page_size + 1]
+
+
+def split_page(rows, page_size, field='timestamp'):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor, page_size, field='timestamp'):
+    """
+    按 (field, id) 倒序返回游标之后的一页，结果为 (记录列表, 下一页游标)
+    """
+    rows = list(page_queryset(queryset, cursor, page_size, field))
+    return split_page(rows, page_size, field)
+
+
+async def akeyset_page(queryset, cursor, page_size, field='timestamp'):
+    """
+    keyset_page 的异步版本
+    """
+    rows = [row async for row in page_queryset(queryset, cursor, page_size, field)]
+    return split_page(rows, page_size, field)
@@ -0,0 +1,121 @@
+"""
+请求耗时统计
+
+PerformanceMiddleware 为每个请求创建一个 RequestTimings，放在 contextvar 中。
+SQL 执行时间由安装在每个数据库连接上的 execute_wrapper 记录，模板渲染时间由
+TimedDjangoTemplates 后端记录，其他耗时（如 edge-tts 合成）用 timed(name) 记录。
+contextvar 会随 sync_to_async 复制到线程中，因此 ASGI 下的异步视图同样适用。
+"""
+import contextvars
+import heapq
+import time
+from contextlib import contextmanager
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates
+
+SLOWEST_QUERIES = 5
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.slowest = []  # 最慢的几条 SQL，(耗时, sql) 小根堆
+        self.durations = {}  # 名称 -> 累计秒数，如 template、tts
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def add_query(self, sql, duration):
+        self.sql_count += 1
+        self.sql_time += duration
+        if len(self.slowest) < SLOWEST_QUERIES:
+            heapq.heappush(self.slowest, (duration, sql))
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, sql))
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+
+    def slowest_queries(self):
+        return sorted(self.slowest, reverse=True)
+
+
+def current():
+    """
+    返回当前请求的 RequestTimings，不在请求中时返回 None
+    """
+    return _current.get()
+
+
+def begin():
+    """
+    开始统计一个请求，返回 (timings, token)，结束时用 token 调用 end
+    """
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """
+    把 with 块的耗时记入当前请求的 name 项，不在请求中时什么也不做
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_sql_wrapper(sender, connection, **kwargs):
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    记录模板渲染时间的 Django 模板后端
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,72 @@
+"""
+线上请求的性能剖析
+
+开启 PROFILING_ENABLED 后，管理员在请求中加上 ?profile=1 或请求头 X-Profile: 1，
+或者按 PROFILING_SAMPLE_RATE 随机抽样，用 cProfile 剖析整个请求。
+结果保存在 PROFILING_DIR 中，最多保留 PROFILING_MAX_FILES 个，最旧的先删除。
+"""
+import io
+import os
+import pstats
+import re
+import time
+
+from django.conf import settings
+
+PROFILE_NAME_RE = re.compile(r'[\w.-]+\.prof')
+DEFAULT_MAX_FILES = 50
+
+
+def profile_dir():
+    return settings.PROFILING_DIR
+
+
+def save_profile(profiler, view_name, elapsed):
+    """
+    保存 cProfile 结果，文件名包含时间、视图名和耗时，返回文件名
+    """
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    view_name = re.sub(r'[^\w-]', '_', view_name)
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'.{int(now * 1000) % 1000:03d}'
+    name = f'{stamp}-{os.getpid()}-{view_name}-{elapsed * 1000:.0f}ms.prof'
+    profiler.dump_stats(os.path.join(directory, name))
+    rotate(directory, getattr(settings, 'PROFILING_MAX_FILES', DEFAULT_MAX_FILES))
+    return name
+
+
+def rotate(directory, max_files):
+    for name in list_profiles()[max_files:]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def list_profiles():
+    """
+    返回已保存的剖析结果文件名，最新的在前
+    """
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    return sorted((name for name in names if PROFILE_NAME_RE.fullmatch(name)), reverse=True)
+
+
+def profile_path(name):
+    """
+    返回剖析结果文件的路径，文件名不合法时返回 None
+    """
+    if not PROFILE_NAME_RE.fullmatch(name):
+        return None
+    return os.path.join(profile_dir(), name)
+
+
+def profile_summary(path, limit=50):
+    # 按累计耗时排序的文本报告
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,104 @@
+"""
+分批删除单词组
+
+删除时先把单词组标记为已删除（deleted_at），页面上立即不再显示；之后由后台任务
+按批删除学习记录、学习进度和单词，每批一条 DELETE ... WHERE id IN (SELECT ... LIMIT n)，
+在各自的短事务中执行。不经过 Django 的级联删除，它会先把所有关联的行读入内存，
+并在整个删除过程中占用 SQLite 的写锁。
+"""
+import time
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import bump_group_version
+from .models import StudyProgress, StudyRecord, Word, WordGroup
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class PurgeResult:
+    total: int = 0
+    records: int = 0
+    progress: int = 0
+    words: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def deleted(self):
+        return self.records + self.progress + self.words
+
+    def summary(self):
+        return (f'删除 {self.words} 个单词、{self.records} 条学习记录、{self.progress} 条学习进度，'
+                f'共 {self.batches} 批，用时 {self.elapsed:.1f} 秒')
+
+
+def hide_group(group_id):
+    """
+    把单词组标记为已删除，返回是否找到了未删除的单词组
+    """
+    hidden = WordGroup.objects.visible().filter(id=group_id).update(deleted_at=timezone.now())
+    bump_group_version(group_id)
+    return bool(hidden)
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def delete_batch(model, where, params, batch_size):
+    """
+    在一个事务中删除 model 中最多 batch_size 行满足 where 的记录，返回删除的行数
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table(model)} WHERE id IN '
+                       f'(SELECT id FROM {table(model)} WHERE {where} LIMIT %s)', [*params, batch_size])
+        return cursor.rowcount
+
+
+def purge_group(group_id, batch_size=DEFAULT_BATCH_SIZE, pause=0.0, progress=None):
+    """
+    分批删除单词组及其单词、学习记录和学习进度，返回 PurgeResult
+
+    pause 是每批之间等待的秒数，让其他请求有机会拿到写锁；
+    progress 是可选的回调，每删除一批调用一次 progress(result)
+    """
+    result = PurgeResult()
+    start = time.perf_counter()
+    group_records = f'word_id IN (SELECT id FROM {table(Word)} WHERE group_id = %s)'
+    steps = [
+        (StudyRecord, group_records, 'records'),
+        (StudyProgress, 'word_group_id = %s', 'progress'),
+        (Word, 'group_id = %s', 'words'),
+    ]
+    result.total = (StudyRecord.objects.filter(word__group_id=group_id).count()
+                    + StudyProgress.objects.filter(word_group_id=group_id).count()
+                    + Word.objects.filter(group_id=group_id).count())
+
+    # 先删除引用单词的学习记录，否则删除单词时违反外键约束；删除期间又写入的记录会让这一批回滚，
+    # 由任务重试时再删除
+    for model, where, field in steps:
+        while True:
+            deleted = delete_batch(model, where, [group_id], batch_size)
+            setattr(result, field, getattr(result, field) + deleted)
+            result.batches += 1
+            result.elapsed = time.perf_counter() - start
+            if progress is not None:
+                progress(result)
+            if deleted < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+    # 删除期间新写入的少量记录（例如正在答题的学生）和单词组本身在最后一个事务中删除
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model, where, field in steps:
+            cursor.execute(f'DELETE FROM {table(model)} WHERE {where}', [group_id])
+            setattr(result, field, getattr(result, field) + cursor.rowcount)
+        cursor.execute(f'DELETE FROM {table(WordGroup)} WHERE id = %s', [group_id])
+    bump_group_version(group_id)
+    result.elapsed = time.perf_counter() - start
+    return result
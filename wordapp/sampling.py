@@ -0,0 +1,94 @@
+"""
+未登录用户的随机抽词
+
+每个进程缓存各单词组的单词 id 数组，按单词组版本号失效，
+抽词只需随机取一个下标再按主键读取一个单词。
+最近出现过的单词记在签名 cookie 里，不写数据库。
+"""
+import random
+import threading
+from array import array
+
+from .caching import group_version
+from .models import Word
+
+RECENT_COOKIE = 'recent_words'
+RECENT_SALT = 'wordapp.sampling'
+RECENT_WINDOW = 10
+MAX_ATTEMPTS = 4
+
+_ids = {}  # group_id -> (版本号, array)
+_ids_lock = threading.Lock()
+
+
+def group_word_ids(group_id, refresh=False):
+    version = group_version(group_id)
+    cached = _ids.get(group_id)
+    if not refresh and cached is not None and cached[0] == version:
+        return cached[1]
+    ids = array('q', Word.objects.filter(group_id=group_id).values_list('id', flat=True))
+    with _ids_lock:
+        _ids[group_id] = (version, ids)
+    return ids
+
+
+def sample_word(group_id, recent=()):
+    """
+    从单词组中随机取一个单词，尽量避开 recent 中的单词；单词组为空时返回 None
+    """
+    ids = group_word_ids(group_id)
+    if not ids:
+        return None
+    # 单词数不多于窗口时，只避开上一个单词
+    avoid = set(recent) if len(ids) > len(recent) else set(recent[-1:])
+    for _ in range(MAX_ATTEMPTS):
+        word_id = ids[random.randrange(len(ids))]
+        if word_id not in avoid:
+            break
+    else:
+        # 多次都抽到最近的单词，从随机位置向后找第一个不在窗口内的
+        start = random.randrange(len(ids))
+        for offset in range(min(len(avoid) + 1, len(ids))):
+            word_id = ids[(start + offset) % len(ids)]
+            if word_id not in avoid:
+                break
+    word = Word.objects.filter(pk=word_id).first()
+    if word is None:
+        # 单词刚被删除，版本号可能还没更新，直接重新读取一次 id 数组
+        ids = group_word_ids(group_id, refresh=True)
+        return Word.objects.filter(pk=ids[random.randrange(len(ids))]).first() if ids else None
+    return word
+
+
+def sample_words(group_id, count, recent=()):
+    """
+    从单词组中随机取最多 count 个不重复的单词，尽量避开 recent 中的单词
+    """
+    ids = group_word_ids(group_id)
+    avoid = set(recent)
+    positions = random.sample(range(len(ids)), min(len(ids), count + len(avoid)))
+    chosen = [ids[i] for i in positions if ids[i] not in avoid][:count]
+    if len(chosen) < count:
+        # 单词太少时允许出现最近的单词
+        chosen += [ids[i] for i in positions if ids[i] in avoid][:count - len(chosen)]
+    words = Word.objects.in_bulk(chosen)
+    return [words[word_id] for word_id in chosen if word_id in words]
+
+
+def get_recent(request, group_id):
+    value = request.get_signed_cookie(RECENT_COOKIE, default='', salt=RECENT_SALT)
+    cookie_group, _, ids = value.partition(':')
+    if cookie_group != str(group_id) or not ids:
+        return []
+    try:
+        return [int(word_id) for word_id in ids.split(',')]
+    except ValueError:
+        return []
+
+
+def set_recent(response, group_id, recent, word):
+    if word is None:
+        return
+    recent = (list(recent) + [word.id])[-RECENT_WINDOW:]
+    value = f"{group_id}:{','.join(map(str, recent))}"
+    response.set_signed_cookie(RECENT_COOKIE, value, salt=RECENT_SALT, httponly=True, samesite='Lax')
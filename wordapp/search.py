@@ -0,0 +1,82 @@
+"""
+跨单词组搜索单词
+
+三个字符及以上的查询使用 FTS5 trigram 全文索引（见迁移 0011），在单词和释义的
+任意位置匹配，不区分大小写；trigram 无法匹配更短的查询（如两个字的中文释义），
+此时用 LIKE 在单词和释义中查找子串，按主键顺序扫描单词表，找到 offset + limit 条结果就停止。
+结果都按单词 id 排序。
+"""
+from django.db import connection
+from django.db.models import Q
+
+from .models import Word, WordGroup
+
+MIN_TRIGRAM_LENGTH = 3
+MAX_LIMIT = 50
+FIELDS = ('id', 'word', 'meaning', 'group_id', 'group_name')
+
+
+def fts_query(query):
+    # 整个查询作为一个短语，避免用户输入被当成 FTS5 语法
+    return '"' + query.replace('"', '""') + '"'
+
+
+def fts_search(query, limit, offset):
+    # 按 rowid 排序由 FTS5 直接按索引顺序返回；按 rank 排序要先取出所有匹配再排序，
+    # 常见片段（如 ing）匹配数万行时慢两个数量级
+    word_table = connection.ops.quote_name(Word._meta.db_table)
+    group_table = connection.ops.quote_name(WordGroup._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT w.id, w.word, w.meaning, w.group_id, g.name '
+            f'FROM wordapp_word_fts f '
+            f'JOIN {word_table} w ON w.id = f.rowid '
+            f'JOIN {group_table} g ON g.id = w.group_id '
+            f'WHERE wordapp_word_fts MATCH %s AND g.deleted_at IS NULL ORDER BY f.rowid LIMIT %s OFFSET %s',
+            [fts_query(query), limit, offset])
+        return [dict(zip(FIELDS, row)) for row in cursor.fetchall()]
+
+
+def like_pattern(query):
+    return '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def substring_search(query, limit, offset):
+    # CROSS JOIN 固定以单词表为外层循环，按 rowid 扫描并在 LIMIT 处停止；否则 SQLite 会从
+    # 单词组的 deleted_at 索引出发，取出所有匹配后再用临时 B 树排序
+    word_table = connection.ops.quote_name(Word._meta.db_table)
+    group_table = connection.ops.quote_name(WordGroup._meta.db_table)
+    pattern = like_pattern(query)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT w.id, w.word, w.meaning, w.group_id, g.name '
+            f'FROM {word_table} w '
+            f'CROSS JOIN {group_table} g ON g.id = w.group_id '
+            f"WHERE (w.word LIKE %s ESCAPE '\\' OR w.meaning LIKE %s ESCAPE '\\') AND g.deleted_at IS NULL "
+            f'ORDER BY w.id LIMIT %s OFFSET %s',
+            [pattern, pattern, limit, offset])
+        return [dict(zip(FIELDS, row)) for row in cursor.fetchall()]
+
+
+def like_search(query, limit, offset):
+    words = (Word.objects.filter(Q(word__icontains=query) | Q(meaning__icontains=query),
+                                 group__deleted_at__isnull=True)
+             .order_by('id')
+             .values_list('id', 'word', 'meaning', 'group_id', 'group__name')[offset:offset + limit])
+    return [dict(zip(FIELDS, row)) for row in words]
+
+
+def search_words(query, limit=10, offset=0):
+    """
+    搜索单词，返回 (结果列表, 是否还有更多)
+    """
+    query = query.strip()
+    if not query:
+        return [], False
+    if connection.vendor != 'sqlite':
+        rows = like_search(query, limit + 1, offset)
+    elif len(query) < MIN_TRIGRAM_LENGTH:
+        rows = substring_search(query, limit + 1, offset)
+    else:
+        rows = fts_search(query, limit + 1, offset)
+    return rows[:limit], len(rows) > limit
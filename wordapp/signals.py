@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .achievements import record_study
+from .activity import record_study_records
+from .models import StudyRecord
+
+
+def study_records_created(records):
+    """
+    学习记录写入后更新统计、每日汇总和成就
+
+    单条保存时由 post_save 自动调用，bulk_create 不发送信号，之后需要手动调用
+    """
+    by_user = {}
+    for record in records:
+        by_user.setdefault(record.user_id, []).append(record)
+    for user_id, user_records in by_user.items():
+        record_study_records(user_id, user_records)
+        record_study(user_id, max(record.timestamp for record in user_records), len(user_records))
+
+
+@receiver(post_save, sender=StudyRecord)
+def study_record_saved(sender, instance, created, **kwargs):
+    if created:
+        study_records_created([instance])
@@ -1,10 +1,57 @@
-from django.test import TestCase
+from django.test import AsyncClient, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
-from .models import Word, WordGroup, StudyRecord, UserAchievement, StudyProgress
-from .views import add_achievements
+from django.db import connection, models
+from django.test.utils import CaptureQueriesContext
+from .models import Word, WordGroup, StudyRecord, UserAchievement, StudyProgress, Achievement, UserStats, DailyActivity
+from .achievements import add_achievements
 from django.utils import timezone
 from datetime import timedelta
+from io import StringIO
+import asyncio
+import json
+import os
+import tempfile
+
+
+def run_jobs():
+    # 在当前线程中执行队列中的后台任务，测试事务中写入的任务只有当前连接可见
+    from .jobs import Worker
+    return Worker('test-worker').run(burst=True)
+
+
+class TempDirMixin:
+    """
+    每个测试使用一个新的临时目录 self.tmpdir，temp_dir_settings 中列出的设置都指向这个目录
+    """
+    temp_dir_settings = ()
+
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        if self.temp_dir_settings:
+            settings_override = override_settings(**dict.fromkeys(self.temp_dir_settings, self.tmpdir))
+            settings_override.enable()
+            self.addCleanup(settings_override.disable)
+
+
+# 测试不使用 settings 中的文件缓存，各测试类中的 cache.clear() 只清空测试用的进程内缓存
+cache_override = override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'lexiq-tests',
+    }
+})
+
+
+def setUpModule():
+    cache_override.enable()
+
+
+def tearDownModule():
+    cache_override.disable()
 
 
 class WordModelTest(TestCase):
@@ -109,7 +156,7 @@ class ViewTests(TestCase):
         response = self.client.get(reverse('display_words'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'wordapp/display_words.html')
-        self.assertIn(self.group, response.context['words_by_group'])
+        self.assertIn(self.group, response.context['groups'])
 
     def test_start_game_view(self):
         response = self.client.get(reverse('start_game'))
@@ -123,6 +170,13 @@ class ViewTests(TestCase):
         self.assertTemplateUsed(response, 'wordapp/game.html')
         self.assertIn('word', response.context)
 
+    def test_game_view_missing_group(self):
+        # 登录用户访问不存在的单词组返回 404，不会创建学习进度
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('game', args=[9999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(StudyProgress.objects.filter(user=self.user).exists())
+
     def test_game_view_post_correct_guess(self):
         response = self.client.post(reverse('game', args=[self.group.id]), {
                                     'word_id': self.word1.id, 'guess': 'test1'})
@@ -211,3 +265,1410 @@ class StudyProgressTestCase(TestCase):
         self.assertEqual(progress2.user, self.user)
         self.assertEqual(progress1.word_group, self.group1)
         self.assertEqual(progress2.word_group, self.group2)
+
+
+class CSVImportTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True)
+
+    def test_upload_csv_bulk_import(self):
+        # 格式错误的行被跳过，其余单词正常导入
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        content = 'apple,苹果\nbad row\n\nbanana,香蕉\n,空单词\n'.encode('utf-8')
+        self.client.force_login(self.admin_user)
+        response = self.client.post(reverse('upload_csv'), {
+            'csv_file': SimpleUploadedFile('unit1.csv', content)})
+        self.assertRedirects(response, reverse('upload_csv'))
+        self.assertEqual(run_jobs(), 1)
+        group = WordGroup.objects.get(name='unit1')
+        self.assertEqual(
+            sorted(Word.objects.filter(group=group).values_list('word', flat=True)),
+            ['apple', 'banana'])
+
+    def test_import_words_chunks(self):
+        from io import BytesIO
+        from .importer import import_words
+        group = WordGroup.objects.create(name='Big Group')
+        lines = ''.join(f'word{i},释义{i}\n' for i in range(25))
+        chunks = []
+        result = import_words(BytesIO(('\ufeff' + lines + 'x,y,z\n').encode('utf-8')), group,
+                              chunk_size=10, progress=lambda r: chunks.append(r.imported))
+        self.assertEqual(result.imported, 25)
+        self.assertEqual(result.skipped, 1)
+        self.assertEqual(result.errors[0][0], 26)
+        self.assertEqual(chunks, [10, 20, 25])
+        self.assertTrue(Word.objects.filter(group=group, word='word0').exists())
+
+    def test_reupload_upserts(self):
+        # 重复上传只更新有变化的释义，文件中没有的单词按需删除
+        from io import BytesIO
+        from .importer import import_words
+        group = WordGroup.objects.create(name='unit3')
+        first = import_words(BytesIO('apple,苹果\nbanana,香焦\ncherry,樱桃\n'.encode()), group)
+        self.assertEqual((first.inserted, first.updated), (3, 0))
+        apple_id = Word.objects.get(group=group, word='apple').id
+        result = import_words(BytesIO('apple,苹果\nbanana,香蕉\ndate,枣\ndate,椰枣\n'.encode()), group)
+        self.assertEqual((result.inserted, result.updated, result.unchanged, result.removed), (1, 1, 1, 0))
+        self.assertEqual(dict(group.word_set.values_list('word', 'meaning')),
+                         {'apple': '苹果', 'banana': '香蕉', 'cherry': '樱桃', 'date': '椰枣'})
+        self.assertEqual(Word.objects.get(group=group, word='apple').id, apple_id)
+        result = import_words(BytesIO('apple,苹果\nbanana,香蕉\n'.encode()), group, delete_missing=True)
+        self.assertEqual((result.inserted, result.updated, result.unchanged, result.removed), (0, 0, 2, 2))
+        self.assertEqual(sorted(group.word_set.values_list('word', flat=True)), ['apple', 'banana'])
+        # 更新的释义同步到全文索引
+        from .search import search_words
+        self.assertEqual([row['word'] for row in search_words('香蕉')[0]], ['banana'])
+
+    def test_upload_delete_missing(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(self.admin_user)
+        for content, delete_missing in [('a,1\nb,2\n', False), ('b,3\nc,4\n', False), ('c,4\n', True)]:
+            self.client.post(reverse('upload_csv'), {
+                'csv_file': SimpleUploadedFile('unit4.csv', content.encode()), 'delete_missing': delete_missing})
+            run_jobs()
+            self.assertEqual(WordGroup.objects.filter(name='unit4').count(), 1)
+        self.assertEqual(list(Word.objects.filter(group__name='unit4').values_list('word', 'meaning')), [('c', '4')])
+
+    def test_import_words_command(self):
+        from django.core.management import call_command
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as f:
+            f.write('cat,猫\ndog,狗\n')
+        try:
+            call_command('import_words', f.name, group='animals', stdout=StringIO(), stderr=StringIO())
+        finally:
+            os.remove(f.name)
+        self.assertEqual(Word.objects.filter(group__name='animals').count(), 2)
+
+
+@override_settings(TTS_SYNTHESIZER='wordapp.tts_cache.FakeSynthesizer')
+class AudioCacheTest(TempDirMixin, TestCase):
+    temp_dir_settings = ['TTS_CACHE_DIR']
+
+    def make_cache(self, **kwargs):
+        from .tts_cache import AudioCache, FakeSynthesizer
+        return AudioCache(self.tmpdir, FakeSynthesizer(delay=kwargs.pop('delay', 0)), **kwargs)
+
+    def test_single_flight(self):
+        # 同时请求同一个单词只合成一次
+        cache = self.make_cache(delay=0.05)
+
+        async def run():
+            return await asyncio.gather(*(cache.get('hello') for _ in range(5)))
+
+        paths = asyncio.run(run())
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(cache.synthesizer.calls, ['hello'])
+        # 等待合成的请求单独计数，不计入命中率
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['waits']), (0, 1, 4))
+        self.assertEqual(stats['hit_ratio'], 0.0)
+        self.assertEqual(os.listdir(self.tmpdir), [os.path.basename(paths[0])])
+
+    def test_lru_eviction(self):
+        cache = self.make_cache(max_entries=2)
+
+        async def run():
+            await cache.get('a')
+            await cache.get('b')
+            await cache.get('a')  # a 变为最近使用
+            await cache.get('c')  # 淘汰 b
+
+        asyncio.run(run())
+        self.assertIsNotNone(cache.lookup('a'))
+        self.assertIsNone(cache.lookup('b'))
+        self.assertIsNotNone(cache.lookup('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_cache_persists_across_instances(self):
+        asyncio.run(self.make_cache().get('persist'))
+        cache = self.make_cache()
+        self.assertIsNotNone(cache.lookup('persist'))
+        asyncio.run(cache.get('persist'))
+        self.assertEqual(cache.synthesizer.calls, [])
+
+    def test_tts_view_uses_cache(self):
+        from .tts_cache import get_audio_cache
+        first = self.client.get(reverse('tts', args=['hello'])).json()
+        second = self.client.get(reverse('tts', args=['hello'])).json()
+        self.assertEqual(first['status'], 'success')
+        self.assertEqual(first['url'], second['url'])
+        stats = get_audio_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+@override_settings(TTS_SYNTHESIZER='wordapp.tts_cache.FakeSynthesizer')
+class PlayAudioTest(TempDirMixin, TestCase):
+    temp_dir_settings = ['TTS_CACHE_DIR']
+
+    def setUp(self):
+        super().setUp()
+        self.url = self.client.get(reverse('tts', args=['hello'])).json()['url']
+        self.body = 'en-GB-SoniaNeural:hello'.encode('utf-8')
+
+    def test_full_response_with_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=3-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.body[3:6])
+        self.assertEqual(response['Content-Range'], f'bytes 3-5/{len(self.body)}')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.body[-5:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=999-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_confined_to_audio_directory(self):
+        response = self.client.get(reverse('play_audio', args=['..%2Fsettings.py']))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('play_audio', args=['0' * 64 + '.mp3']))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TTS_SYNTHESIZER='wordapp.tts_cache.FakeSynthesizer')
+class PregenerateTTSTest(TempDirMixin, TestCase):
+    temp_dir_settings = ['TTS_CACHE_DIR']
+
+    def setUp(self):
+        super().setUp()
+        self.group = WordGroup.objects.create(name='Warm Group')
+        for word in ['alpha', 'beta', 'gamma']:
+            Word.objects.create(word=word, meaning='meaning', group=self.group)
+        # 同一组内单词唯一，重复的单词放在另一组
+        self.other_group = WordGroup.objects.create(name='Warm Group 2')
+        Word.objects.create(word='alpha', meaning='meaning', group=self.other_group)
+
+    def test_command_skips_cached_words(self):
+        from django.core.management import CommandError, call_command
+        from .tts_cache import get_audio_cache
+        call_command('pregenerate_tts', group=self.group.id, stdout=StringIO())
+        self.assertEqual(sorted(get_audio_cache().synthesizer.calls), ['alpha', 'beta', 'gamma'])
+        out = StringIO()
+        call_command('pregenerate_tts', group=self.group.id, stdout=out)
+        self.assertEqual(len(get_audio_cache().synthesizer.calls), 3)
+        self.assertIn('已缓存 3', out.getvalue())
+        self.group.deleted_at = timezone.now()
+        self.group.save()
+        with self.assertRaises(CommandError):
+            call_command('pregenerate_tts', group=self.group.id, stdout=StringIO())
+
+    def test_warm_retries_failures(self):
+        from .tts_cache import AudioCache, FakeSynthesizer, warm
+
+        class FlakySynthesizer(FakeSynthesizer):
+            async def synthesize(self, text, voice, path):
+                self.calls.append(text)
+                if self.calls.count(text) < 3:
+                    raise OSError('temporary failure')
+                await super().synthesize(text, voice, path)
+
+        cache = AudioCache(self.tmpdir, FlakySynthesizer())
+        result = asyncio.run(warm(cache, ['one', 'two'], concurrency=2, retries=2, backoff=0))
+        self.assertEqual(result.synthesized, 2)
+        self.assertEqual(result.failed, [])
+        result = asyncio.run(warm(cache, ['three'], retries=1, backoff=0))
+        self.assertEqual(len(result.failed), 1)
+
+    def test_admin_action(self):
+        admin_user = User.objects.create_superuser(username='root', password='rootpass')
+        deleted = WordGroup.objects.create(name='Deleted Group', deleted_at=timezone.now())
+        Word.objects.create(word='delta', meaning='meaning', group=deleted)
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:wordapp_wordgroup_changelist'), {
+            'action': 'pregenerate_tts', '_selected_action': [self.group.id, self.other_group.id, deleted.id]})
+        self.assertEqual(response.status_code, 302)
+        run_jobs()
+        # 已删除单词组中的 delta 不生成语音
+        self.assertEqual(len([n for n in os.listdir(self.tmpdir) if n.endswith('.mp3')]), 3)
+
+
+class StudyQueueTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='queueuser', password='12345')
+        self.group = WordGroup.objects.create(name='Queue Group')
+        self.words = [Word.objects.create(word=f'w{i}', meaning='m', group=self.group)
+                      for i in range(5)]
+        self.progress = StudyProgress.objects.create(user=self.user, word_group=self.group)
+        self.progress.reset_progress()
+
+    def test_each_word_once_per_round(self):
+        drawn = [self.progress.next_word() for _ in range(5)]
+        self.assertCountEqual(drawn, self.words)
+        # 一轮学完后重新开始
+        self.assertIn(self.progress.next_word(), self.words)
+        self.assertEqual(self.progress.cursor, 1)
+
+    def test_pop_is_atomic_across_instances(self):
+        # 模拟两个标签页各自持有同一条进度
+        other = StudyProgress.objects.get(pk=self.progress.pk)
+        ids = [self.progress.pop_word_id(), other.pop_word_id(),
+               self.progress.pop_word_id(), other.pop_word_id(), other.pop_word_id()]
+        self.assertCountEqual(ids, [w.id for w in self.words])
+        self.assertIsNone(self.progress.pop_word_id())
+
+    def test_deleted_words_are_skipped(self):
+        Word.objects.filter(pk__in=[w.id for w in self.words[:4]]).delete()
+        self.assertEqual(self.progress.next_word(), self.words[4])
+
+    def test_next_word_query_count(self):
+        with self.assertNumQueries(2):
+            self.progress.next_word()
+
+
+class AchievementEngineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='streakuser', password='12345')
+        self.group = WordGroup.objects.create(name='Streak Group')
+        self.word = Word.objects.create(word='streak', meaning='连续', group=self.group)
+
+    def test_stats_updated_on_write(self):
+        for _ in range(10):
+            StudyRecord.objects.create(user=self.user, word=self.word)
+        stats = self.user.stats
+        self.assertEqual(stats.total_records, 10)
+        self.assertEqual(stats.current_streak, 1)
+        self.assertEqual(stats.words_in_week(timezone.localdate()), 10)
+        names = set(UserAchievement.objects.filter(user=self.user)
+                    .values_list('achievement__name', flat=True))
+        self.assertEqual(names, {'千里之行', '拾级而上'})
+
+    def test_streak_award(self):
+        from .achievements import record_study
+        UserStats.objects.create(user=self.user)  # 不从历史记录重建，直接按事件累计
+        start = timezone.now() - timedelta(days=40)
+        for day in range(31):
+            record_study(self.user.id, start + timedelta(days=day))
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.longest_streak, 31)
+        self.assertTrue(UserAchievement.objects.filter(
+            user=self.user, achievement__name='心如明镜').exists())
+        # 中断一天后连续天数重新计算
+        record_study(self.user.id, start + timedelta(days=32))
+        stats.refresh_from_db()
+        self.assertEqual((stats.current_streak, stats.longest_streak), (1, 31))
+
+    def test_rebuild_from_history(self):
+        from .achievements import rebuild_stats
+        StudyRecord.objects.create(user=self.user, word=self.word)
+        UserStats.objects.filter(user=self.user).delete()
+        stats = rebuild_stats(self.user.id)
+        self.assertEqual(stats.total_records, 1)
+        self.assertEqual(stats.current_streak, 1)
+
+    def test_achievements_are_not_duplicated(self):
+        from .achievements import add_achievements
+        StudyRecord.objects.create(user=self.user, word=self.word)
+        add_achievements(self.user.id)
+        add_achievements(self.user.id)
+        self.assertEqual(UserAchievement.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Achievement.objects.filter(name='千里之行').count(), 1)
+
+    def test_view_does_not_scan_history(self):
+        for _ in range(5):
+            StudyRecord.objects.create(user=self.user, word=self.word)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('view_study_records'))
+        self.assertFalse(any('wordapp_userstats' in q['sql'] and 'INSERT' in q['sql']
+                             for q in queries.captured_queries))
+        self.assertFalse(any('INSERT' in q['sql'] and 'wordapp_achievement' in q['sql']
+                             for q in queries.captured_queries))
+
+
+class DailyActivityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='activeuser', password='12345')
+        group = WordGroup.objects.create(name='Activity Group')
+        self.word1 = Word.objects.create(word='one', meaning='一', group=group)
+        self.word2 = Word.objects.create(word='two', meaning='二', group=group)
+
+    def test_rollup_maintained_on_write(self):
+        for word in [self.word1, self.word1, self.word2]:
+            StudyRecord.objects.create(user=self.user, word=word)
+        activity = DailyActivity.objects.get(user=self.user)
+        self.assertEqual(activity.date, timezone.localdate())
+        self.assertEqual((activity.words_studied, activity.distinct_words), (3, 2))
+
+    def test_backfill(self):
+        from django.core.management import call_command
+        record = StudyRecord.objects.create(user=self.user, word=self.word1)
+        StudyRecord.objects.filter(pk=record.pk).update(timestamp=timezone.now() - timedelta(days=3))
+        StudyRecord.objects.create(user=self.user, word=self.word2)
+        call_command('backfill_activity', stdout=StringIO())
+        rows = list(DailyActivity.objects.filter(user=self.user).order_by('date')
+                    .values_list('words_studied', flat=True))
+        self.assertEqual(rows, [1, 1])
+
+    def test_heatmap_endpoint(self):
+        from .activity import streak_stats
+        today = timezone.localdate()
+        for days_ago in [0, 1, 2, 5, 6]:
+            DailyActivity.objects.create(user=self.user, date=today - timedelta(days=days_ago),
+                                         words_studied=days_ago + 1, distinct_words=1)
+        DailyActivity.objects.create(user=self.user, date=today - timedelta(days=400), words_studied=9)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3):  # session、user、汇总
+            data = self.client.get(reverse('activity_heatmap')).json()
+        self.assertEqual(data['active_days'], 5)
+        self.assertEqual(data['total_words'], 1 + 2 + 3 + 6 + 7)
+        self.assertEqual(data['streak'], {'current': 3, 'longest': 3})
+        self.assertEqual(streak_stats([today - timedelta(days=1)], today)['current'], 1)
+        self.assertEqual(streak_stats([today - timedelta(days=2)], today)['current'], 0)
+
+    def test_heatmap_requires_login(self):
+        self.assertEqual(self.client.get(reverse('activity_heatmap')).status_code, 403)
+
+
+class StudyRecordPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='pageuser', password='12345')
+        group = WordGroup.objects.create(name='Page Group')
+        words = Word.objects.bulk_create(
+            [Word(word=f'p{i}', meaning='m', group=group) for i in range(120)])
+        StudyRecord.objects.bulk_create([StudyRecord(user=cls.user, word=word) for word in words])
+        # bulk_create 的记录时间相同，分页依靠 id 区分先后
+
+    def test_pages_cover_all_records(self):
+        self.client.force_login(self.user)
+        seen = []
+        cursor = ''
+        while True:
+            data = self.client.get(reverse('study_records_json'), {'before': cursor}).json()
+            seen.extend(record['id'] for record in data['records'])
+            cursor = data['next']
+            if not cursor:
+                break
+        ids = list(StudyRecord.objects.filter(user=self.user).values_list('id', flat=True))
+        self.assertEqual(seen, sorted(ids, reverse=True))
+
+    def test_constant_query_count(self):
+        self.client.force_login(self.user)
+        first = self.client.get(reverse('view_study_records'))
+        self.assertEqual(len(first.context['study_records']), 50)
+        with CaptureQueriesContext(connection) as page1:
+            self.client.get(reverse('view_study_records'))
+        with CaptureQueriesContext(connection) as page2:
+            response = self.client.get(reverse('view_study_records'),
+                                       {'before': first.context['next_cursor']})
+        self.assertEqual(len(page1), len(page2))
+        self.assertEqual(len(response.context['study_records']), 50)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.client.force_login(self.user)
+        data = self.client.get(reverse('study_records_json'), {'before': '!!bad'}).json()
+        self.assertEqual(len(data['records']), 50)
+
+
+class DisplayWordsTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.admin_user = User.objects.create_user(
+            username='admin', password='adminpass', is_staff=True)
+        self.groups = [WordGroup.objects.create(name=f'Group {i}') for i in range(5)]
+        for group in self.groups:
+            Word.objects.bulk_create(
+                [Word(word=f'{group.id}-{i}', meaning='m', group=group) for i in range(150)])
+        from .counters import recount_groups
+        recount_groups()
+
+    def test_display_words_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('display_words'))
+        counts = {group.id: group.word_count for group in response.context['groups']}
+        self.assertEqual(counts[self.groups[0].id], 150)
+
+    def test_group_words_paginated_and_cached(self):
+        url = reverse('group_words', args=[self.groups[0].id])
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['words']), 100)
+        self.assertEqual(first['next_page'], 2)
+        second = self.client.get(url, {'page': 2}).json()
+        self.assertEqual(len(second['words']), 50)
+        self.assertIsNone(second['next_page'])
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_upload_invalidates_cached_words(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        group = WordGroup.objects.create(name='unit9')
+        url = reverse('group_words', args=[group.id])
+        self.assertEqual(self.client.get(url).json()['words'], [])
+        self.client.force_login(self.admin_user)
+        self.client.post(reverse('upload_csv'), {
+            'csv_file': SimpleUploadedFile('unit9.csv', 'new,新\n'.encode('utf-8'))})
+        run_jobs()
+        self.assertEqual(self.client.get(url).json()['words'], [{'word': 'new', 'meaning': '新'}])
+
+    def test_delete_word_group(self):
+        group = self.groups[0]
+        url = reverse('group_words', args=[group.id])
+        self.client.get(url)
+        self.client.force_login(self.admin_user)
+        response = self.client.post(reverse('delete_word_group'), {'group_id': group.id})
+        self.assertRedirects(response, reverse('upload_csv'))
+        self.assertTrue(WordGroup.objects.filter(pk=group.pk).exists())
+        # 已标记删除的单词组不再返回缓存的单词
+        self.assertEqual(self.client.get(url).status_code, 404)
+        run_jobs()
+        self.assertFalse(WordGroup.objects.filter(pk=group.pk).exists())
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class AnonymousSamplingTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.group = WordGroup.objects.create(name='Sample Group')
+        self.words = Word.objects.bulk_create(
+            [Word(word=f's{i}', meaning='m', group=self.group) for i in range(20)])
+
+    def test_sample_uses_cached_ids(self):
+        from .sampling import sample_word
+        sample_word(self.group.id)
+        with self.assertNumQueries(1):
+            word = sample_word(self.group.id)
+        self.assertEqual(word.group_id, self.group.id)
+
+    def test_recent_window_avoids_repeats(self):
+        url = reverse('game', args=[self.group.id])
+        seen = []
+        for _ in range(10):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertFalse(any(q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+                                 for q in queries.captured_queries))
+            seen.append(response.context['word'].id)
+        self.assertEqual(len(set(seen)), 10)
+
+    def test_cache_invalidated_when_group_changes(self):
+        from io import BytesIO
+        from .importer import import_words
+        from .sampling import group_word_ids
+        self.assertEqual(len(group_word_ids(self.group.id)), 20)
+        import_words(BytesIO('extra,额外\n'.encode('utf-8')), self.group)
+        self.assertEqual(len(group_word_ids(self.group.id)), 21)
+
+    def test_empty_group(self):
+        from .sampling import sample_word
+        empty = WordGroup.objects.create(name='Empty')
+        self.assertIsNone(sample_word(empty.id))
+
+    def test_deleted_words_refresh_ids(self):
+        from .sampling import group_word_ids, sample_word
+        group_word_ids(self.group.id)
+        # 其他进程删除了单词，本进程的 id 数组还是旧的
+        Word.objects.filter(group=self.group).exclude(pk=self.words[0].pk).delete()
+        self.assertEqual(sample_word(self.group.id), self.words[0])
+
+
+class ReviewSessionAPITest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='apiuser', password='12345')
+        self.group = WordGroup.objects.create(name='API Group')
+        self.words = Word.objects.bulk_create(
+            [Word(word=f'api{i}', meaning=f'接口{i}', group=self.group) for i in range(30)])
+
+    def fetch(self, n=20):
+        return self.client.get(reverse('session_words', args=[self.group.id]), {'n': n}).json()
+
+    def post(self, name, data, args=()):
+        return self.client.post(reverse(name, args=args), json.dumps(data),
+                                content_type='application/json').json()
+
+    def test_batch_draws_from_study_queue(self):
+        self.client.force_login(self.user)
+        first = self.fetch()['words']
+        second = self.fetch()['words']
+        self.assertEqual(len(first), 20)
+        self.assertEqual(len(second), 20)
+        # 第一轮剩下的 10 个单词和新一轮的单词不重复
+        self.assertEqual(len({w['id'] for w in first + second[:10]}), 30)
+        self.assertEqual(len({w['id'] for w in second}), 20)
+        word = Word.objects.get(pk=first[0]['id'])
+        self.assertEqual(first[0]['length'], len(word.word))
+        self.assertNotIn(word.word, json.dumps(first[0]))
+
+    def test_check_and_results(self):
+        from .api import answer_check
+        self.client.force_login(self.user)
+        batch = self.fetch(n=5)['words']
+        answers = {w.id: w.word for w in self.words}
+        first = batch[0]
+        self.assertEqual(first['check'], answer_check(first['token'], answers[first['id']]))
+        checked = self.post('session_check', {'token': first['token'], 'guess': 'apx'})
+        self.assertFalse(checked['correct'])
+        self.assertEqual(checked['feedback'][:2], ['green', 'green'])
+
+        results = [{'token': w['token'], 'guess': answers[w['id']]} for w in batch[:4]]
+        results.append({'token': batch[4]['token'], 'guess': 'wrong'})
+        results.append({'token': batch[0]['token'], 'guess': answers[batch[0]['id']]})  # 重复提交
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post('session_results', {'results': results}, args=[self.group.id])
+        self.assertEqual(response['saved'], 4)
+        inserts = [q for q in queries.captured_queries
+                   if q['sql'].startswith('INSERT INTO "wordapp_studyrecord"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(StudyRecord.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(UserStats.objects.get(user=self.user).total_records, 4)
+        self.assertEqual(DailyActivity.objects.get(user=self.user).distinct_words, 4)
+
+    def test_tampered_token_is_ignored(self):
+        self.client.force_login(self.user)
+        token = self.fetch(n=1)['words'][0]['token']
+        response = self.post('session_results', {'results': [{'token': token + 'x', 'guess': 'a'}]},
+                             args=[self.group.id])
+        self.assertEqual(response['results'], [])
+        self.assertEqual(response['saved'], 0)
+
+    def test_anonymous_batch(self):
+        batch = self.fetch(n=10)['words']
+        self.assertEqual(len({w['id'] for w in batch}), 10)
+
+    def test_missing_group(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('session_words', args=[9999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(StudyProgress.objects.filter(user=self.user).exists())
+
+
+# 后台线程不会在测试期间自动写入，由测试显式触发
+@override_settings(STUDY_RECORD_WRITE_BEHIND=True, STUDY_RECORD_WRITE_BEHIND_MAX_LAG=3600)
+class WriteBehindTest(TempDirMixin, TestCase):
+    temp_dir_settings = ['STUDY_RECORD_WRITE_BEHIND_SPOOL']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='bufferuser', password='12345')
+        self.group = WordGroup.objects.create(name='Buffer Group')
+        self.word = Word.objects.create(word='buffer', meaning='缓冲', group=self.group)
+
+    def test_records_are_buffered_then_flushed(self):
+        from .writebehind import get_buffer
+        self.client.force_login(self.user)
+        self.client.post(reverse('game', args=[self.group.id]),
+                         {'word_id': self.word.id, 'guess': 'buffer'})
+        self.assertFalse(StudyRecord.objects.filter(user=self.user).exists())
+        self.assertTrue(get_buffer().has_pending(self.user.id))
+        with open(os.path.join(self.tmpdir, f'{os.getpid()}.spool')) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertEqual(get_buffer().flush(), 1)
+        self.assertEqual(StudyRecord.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(UserStats.objects.get(user=self.user).total_records, 1)
+        with open(os.path.join(self.tmpdir, f'{os.getpid()}.spool')) as f:
+            self.assertEqual(f.read(), '')
+
+    def test_deleted_word_does_not_block_flush(self):
+        from .writebehind import get_buffer
+        other = Word.objects.create(word='gone', meaning='删除', group=self.group)
+        buffer = get_buffer(start=False)
+        buffer.add(self.user.id, [self.word.id, other.id, other.id])
+        other.delete()  # 例如导入时 delete_missing 删除了这个单词
+        with self.assertLogs('wordapp.writebehind', 'WARNING'):
+            self.assertEqual(buffer.flush(), 1)
+        self.assertFalse(buffer.has_pending())
+        with open(os.path.join(self.tmpdir, f'{os.getpid()}.spool')) as f:
+            self.assertEqual(f.read(), '')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('view_study_records')).status_code, 200)
+
+    def test_failed_flush_does_not_break_views(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from .writebehind import WriteBehindBuffer, get_buffer
+        get_buffer(start=False).add(self.user.id, [self.word.id])
+        self.client.force_login(self.user)
+        with mock.patch.object(WriteBehindBuffer, '_drop_orphans', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('wordapp.writebehind', 'ERROR'):
+            response = self.client.get(reverse('study_records_json'))
+        self.assertEqual(response.status_code, 200)
+        # 记录留在缓冲区，下次写入
+        self.assertTrue(get_buffer().has_pending(self.user.id))
+        self.assertEqual(get_buffer().flush(), 1)
+
+    def test_read_your_writes(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('game', args=[self.group.id]),
+                         {'word_id': self.word.id, 'guess': 'buffer'})
+        data = self.client.get(reverse('study_records_json')).json()
+        self.assertEqual([r['word'] for r in data['records']], ['buffer'])
+
+    def test_event_timestamp_is_kept(self):
+        from .writebehind import get_buffer
+        buffer = get_buffer(start=False)
+        when = timezone.now() - timedelta(days=2)
+        buffer.add(self.user.id, [self.word.id], timestamp=when)
+        buffer.flush()
+        self.assertEqual(StudyRecord.objects.get(user=self.user).timestamp, when)
+
+    def test_recover_spool_of_dead_process(self):
+        from .writebehind import get_buffer
+        dead_pid = 2 ** 22 + 1  # 超过 Linux 默认的最大 pid
+        with open(os.path.join(self.tmpdir, f'{dead_pid}.spool'), 'w') as f:
+            f.write(json.dumps({'u': self.user.id, 'w': self.word.id,
+                                't': timezone.now().isoformat()}) + '\n')
+        buffer = get_buffer(start=False)
+        self.assertTrue(buffer.has_pending(self.user.id))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, f'{dead_pid}.spool')))
+        buffer.flush()
+        self.assertEqual(StudyRecord.objects.filter(user=self.user).count(), 1)
+
+
+class SQLiteBackendTest(TempDirMixin, TestCase):
+    def file_connection(self, **options):
+        from django.db.utils import ConnectionHandler
+        handler = ConnectionHandler({'default': {
+            'ENGINE': 'LexiQ.sqlite_backend',
+            'NAME': os.path.join(self.tmpdir, 'test.sqlite3'),
+            'OPTIONS': options,
+        }})
+        self.addCleanup(handler.close_all)
+        return handler['default']
+
+    def test_pragmas_applied_on_connect(self):
+        conn = self.file_connection(pragmas={'cache_size': -1000})
+        with conn.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -1000)
+
+    def test_busy_write_is_retried(self):
+        import sqlite3
+        import threading
+        conn = self.file_connection(pragmas={'busy_timeout': 0}, busy_retries=8, busy_backoff=0.02)
+        with conn.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x INTEGER)')
+        # 另一个连接持有写锁，稍后释放
+        holder = sqlite3.connect(conn.settings_dict['NAME'], isolation_level=None, check_same_thread=False)
+        self.addCleanup(holder.close)
+        holder.execute('BEGIN IMMEDIATE')
+        holder.execute('INSERT INTO t VALUES (1)')
+        timer = threading.Timer(0.1, holder.execute, ['COMMIT'])
+        timer.start()
+        self.addCleanup(timer.join)
+        with conn.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (2)')
+            cursor.execute('SELECT COUNT(*) FROM t')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_busy_error_without_retries(self):
+        import sqlite3
+        from django.db import OperationalError
+        conn = self.file_connection(pragmas={'busy_timeout': 0}, busy_retries=0)
+        with conn.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x INTEGER)')
+        holder = sqlite3.connect(conn.settings_dict['NAME'], isolation_level=None)
+        self.addCleanup(holder.close)
+        holder.execute('BEGIN IMMEDIATE')
+        with self.assertRaises(OperationalError):
+            with conn.cursor() as cursor:
+                cursor.execute('INSERT INTO t VALUES (1)')
+        holder.execute('ROLLBACK')
+
+
+class QueryCountTest(TestCase):
+    # 在接近真实的数据量下限制每个页面的 SQL 查询数，防止出现 N+1 查询
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='queryuser', password='12345')
+        cls.staff = User.objects.create_user(username='querystaff', password='12345', is_staff=True)
+        groups = WordGroup.objects.bulk_create([WordGroup(name=f'Group {i}') for i in range(20)])
+        Word.objects.bulk_create([
+            Word(word=f'word{g.id}x{i}', meaning='释义', group=g) for g in groups for i in range(200)])
+        cls.group = groups[0]
+        words = list(Word.objects.filter(group=cls.group)[:100])
+        StudyRecord.objects.bulk_create([StudyRecord(user=cls.user, word=w) for w in words * 5])
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def assertMaxQueries(self, limit, func):
+        with CaptureQueriesContext(connection) as ctx:
+            response = func()
+        self.assertLess(response.status_code, 400)
+        self.assertLessEqual(len(ctx.captured_queries), limit,
+                             '\n'.join(q['sql'] for q in ctx.captured_queries))
+
+    def test_game(self):
+        self.client.force_login(self.user)
+        url = reverse('game', args=[self.group.id])
+        self.client.get(url)  # 第一次访问会创建学习进度
+        self.assertMaxQueries(6, lambda: self.client.get(url))
+        word = Word.objects.filter(group=self.group).first()
+        answer = {'word_id': word.id, 'guess': word.word}
+        self.client.post(url, answer)  # 第一次答对会生成学习统计
+        # 含确认单词组存在的一次查询
+        self.assertMaxQueries(14, lambda: self.client.post(url, answer))
+
+    def test_game_anonymous(self):
+        url = reverse('game', args=[self.group.id])
+        self.client.get(url)
+        self.assertMaxQueries(2, lambda: self.client.get(url))
+
+    def test_display_words(self):
+        self.assertMaxQueries(1, lambda: self.client.get(reverse('display_words')))
+
+    def test_view_study_records(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('view_study_records'))
+        self.assertMaxQueries(5, lambda: self.client.get(reverse('view_study_records')))
+
+    def test_upload_csv(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(self.staff)
+        content = '\n'.join(f'csvword{i},释义{i}' for i in range(2500)).encode('utf-8')
+        upload = SimpleUploadedFile('bulk.csv', content, content_type='text/csv')
+        # 请求中只创建任务
+        self.assertMaxQueries(8, lambda: self.client.post(reverse('upload_csv'), {'csv_file': upload}))
+        # SQLite 每条 INSERT 最多 999 个参数，每块 1000 行分成 4 条 INSERT，共 10 条；
+        # 另有读取组内已有单词、每块的事务、单词数和进度，以及任务的领取和完成
+        with CaptureQueriesContext(connection) as ctx:
+            run_jobs()
+        self.assertLessEqual(len(ctx.captured_queries), 29, '\n'.join(q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(Word.objects.filter(group__name='bulk').count(), 2500)
+
+
+class QueryPlanTest(TestCase):
+    # 热点查询必须走索引
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planuser', password='12345')
+        cls.group = WordGroup.objects.create(name='Plan Group')
+        Word.objects.bulk_create([Word(word=f'plan{i}', meaning='释义', group=cls.group) for i in range(50)])
+
+    def assertUsesIndex(self, queryset, table, detail):
+        # 唯一约束在 SQLite 中建表时生成 sqlite_autoindex_*，因此按索引名或使用的列判断
+        plan = queryset.explain()
+        lines = [line for line in plan.splitlines() if f'SEARCH {table} USING' in line]
+        self.assertTrue(lines, plan)
+        self.assertIn('INDEX', lines[0])
+        self.assertIn(detail, lines[0])
+
+    def test_study_records_page(self):
+        self.assertUsesIndex(
+            StudyRecord.objects.filter(user=self.user).order_by('-timestamp', '-id')[:51],
+            'wordapp_studyrecord', 'studyrecord_user_time_idx')
+
+    def test_group_words(self):
+        self.assertUsesIndex(
+            Word.objects.filter(group=self.group).values_list('word', flat=True),
+            'wordapp_word', 'COVERING INDEX sqlite_autoindex_wordapp_word_1 (group_id=?)')
+
+    def test_study_progress(self):
+        self.assertUsesIndex(
+            StudyProgress.objects.filter(user=self.user, word_group=self.group),
+            'wordapp_studyprogress', '(user_id=? AND word_group_id=?)')
+
+    def test_user_achievement(self):
+        self.assertUsesIndex(
+            UserAchievement.objects.filter(user=self.user, achievement__name='千里之行'),
+            'wordapp_userachievement', '(user_id=? AND achievement_id=?)')
+
+    def test_daily_activity(self):
+        today = timezone.localdate()
+        self.assertUsesIndex(
+            DailyActivity.objects.filter(user=self.user, date__gte=today - timedelta(days=30)),
+            'wordapp_dailyactivity', '(user_id=? AND date>?)')
+
+    def test_short_search_stops_at_limit(self):
+        # 短查询按单词表主键顺序扫描，不能先取出所有匹配再排序
+        from .search import search_words
+        with CaptureQueriesContext(connection) as ctx:
+            results, has_more = search_words('释义', limit=5)
+        self.assertEqual((len(results), has_more), (5, True))
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + ctx.captured_queries[0]['sql'])
+            plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('SCAN w', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(TTS_SYNTHESIZER='wordapp.tts_cache.FakeSynthesizer')
+class PerformanceMiddlewareTest(TempDirMixin, TestCase):
+    temp_dir_settings = ['TTS_CACHE_DIR']
+
+    @classmethod
+    def setUpTestData(cls):
+        group = WordGroup.objects.create(name='Perf Group')
+        Word.objects.create(word='perf', meaning='性能', group=group)
+
+    def server_timing(self, response):
+        return dict(item.split(';', 1) for item in response['Server-Timing'].split(', '))
+
+    def test_sync_view_timings(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('display_words'))
+        timing = self.server_timing(response)
+        self.assertEqual(timing['view'], 'desc="display_words"')
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['db'])
+        self.assertIn('template', timing)
+        self.assertIn('total', timing)
+
+    def test_async_tts_view_timings(self):
+        response = asyncio.run(AsyncClient().get(reverse('tts', args=['timing'])))
+        timing = self.server_timing(response)
+        self.assertEqual(timing['view'], 'desc="tts"')
+        self.assertIn('tts', timing)
+
+    def test_slow_request_logged(self):
+        with override_settings(PERF_SLOW_REQUEST_MS=0), self.assertLogs('wordapp.perf', 'WARNING') as logs:
+            self.client.get(reverse('display_words'))
+        self.assertIn('display_words', logs.output[0])
+        self.assertIn('wordapp_wordgroup', logs.output[0])
+
+
+class MetricsTest(TempDirMixin, TestCase):
+    def metric_value(self, text, sample):
+        for line in text.splitlines():
+            if line.startswith(sample + ' '):
+                return float(line.split()[-1])
+        return 0.0
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_request_metrics(self):
+        before = self.metric_value(self.client.get(reverse('metrics')).content.decode(),
+                                   'lexiq_requests_total{view="display_words",status="200"}')
+        self.client.get(reverse('display_words'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertEqual(self.metric_value(text, 'lexiq_requests_total{view="display_words",status="200"}'),
+                         before + 1)
+        self.assertIn('lexiq_request_duration_seconds_bucket{view="display_words",le="+Inf"}', text)
+        self.assertIn('# TYPE lexiq_request_duration_seconds histogram', text)
+        self.assertGreater(self.metric_value(text, 'lexiq_db_queries_total{view="display_words"}'), 0)
+
+    def test_access_restricted(self):
+        # 默认只允许管理员访问，包括本机地址
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+        staff = User.objects.create_user(username='metricsstaff', password='12345', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_thread_shards_merged(self):
+        import threading
+        from .metrics import Counter, Registry
+        registry = Registry()
+        counter = Counter('test_total', 'test', registry=registry)
+        threads = [threading.Thread(target=lambda: [counter.inc() for i in range(100)]) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc()
+        self.assertIn('test_total 401', registry.render())
+
+    def test_processes_merged_through_directory(self):
+        from .metrics import IMPORT_ROWS, REGISTRY
+        with override_settings(METRICS_DIR=self.tmpdir):
+            own = self.metric_value(REGISTRY.render(), 'lexiq_csv_import_rows_total{result="imported"}')
+            # 另一个 worker 进程写下的数据
+            with open(os.path.join(self.tmpdir, '999999.json'), 'w') as f:
+                json.dump([[IMPORT_ROWS.name, ['imported'], 40]], f)
+            text = REGISTRY.render()
+        self.assertEqual(self.metric_value(text, 'lexiq_csv_import_rows_total{result="imported"}'), own + 40)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, f'{os.getpid()}.json')))
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_MAX_FILES=2)
+class ProfilerTest(TempDirMixin, TestCase):
+    temp_dir_settings = ['PROFILING_DIR']
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='profilestaff', password='12345', is_staff=True)
+
+    def test_staff_can_profile_request(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('display_words'), {'profile': '1'})
+        name = response['X-Profile']
+        self.assertIn('display_words', name)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, name)))
+        stats = self.client.get(reverse('admin:profile_stats', args=[name]))
+        self.assertIn('cumulative', stats.content.decode())
+        self.assertEqual(self.client.get(reverse('admin:profile_download', args=[name])).status_code, 200)
+        self.assertContains(self.client.get(reverse('admin:profiles')), name)
+        self.assertContains(self.client.get(reverse('admin:index')), reverse('admin:profiles'))
+
+    async def test_async_view_profiled_without_thread(self):
+        # 异步视图在事件循环中剖析，不会被中间件转成同步调用
+        from asgiref.sync import iscoroutinefunction, sync_to_async
+        from .middleware import ProfilerMiddleware
+
+        async def get_response(request):
+            return None
+        self.assertTrue(iscoroutinefunction(ProfilerMiddleware(get_response)))
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.staff)
+        response = await client.get(reverse('view_study_records'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view_study_records', response['X-Profile'])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, response['X-Profile'])))
+
+    def test_only_staff_can_trigger(self):
+        user = User.objects.create_user(username='profileuser', password='12345')
+        self.client.force_login(user)
+        response = self.client.get(reverse('display_words'), {'profile': '1'})
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+        # 剖析结果页面只允许管理员访问，其他用户会跳转到后台登录页
+        self.assertEqual(self.client.get(reverse('admin:profiles')).status_code, 302)
+
+    def test_directory_is_bounded(self):
+        self.client.force_login(self.staff)
+        for i in range(4):
+            self.client.get(reverse('display_words'), HTTP_X_PROFILE='1')
+        self.assertEqual(len(os.listdir(self.tmpdir)), 2)
+
+    def test_disabled_middleware_not_loaded(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        from .middleware import ProfilerMiddleware
+        with override_settings(PROFILING_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilerMiddleware(lambda request: None)
+
+
+class BenchmarkTest(TestCase):
+    def seed(self, **kwargs):
+        from .bench import seed
+        return seed(seed=7, users=5, groups=3, words_per_group=10, records=200, **kwargs)
+
+    def test_seed_is_deterministic(self):
+        from .bench import clear
+        result = self.seed()
+        self.assertEqual((result.users, result.groups, result.words, result.records, result.progress),
+                         (5, 3, 30, 200, 15))
+        self.assertEqual(StudyRecord.objects.count(), 200)
+        self.assertEqual(DailyActivity.objects.aggregate(n=models.Sum('words_studied'))['n'], 200)
+        words = list(Word.objects.order_by('id').values_list('word', flat=True))
+        clear()
+        self.assertFalse(StudyRecord.objects.exists())
+        self.seed()
+        self.assertEqual(list(Word.objects.order_by('id').values_list('word', flat=True)), words)
+
+    def test_bench_load_reports_percentiles(self):
+        from django.core.management import call_command
+        self.seed()
+        out = StringIO()
+        call_command('bench_load', '--requests', '4', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('p99_ms', lines[0])
+        rows = {line.split()[0]: line.split() for line in lines[1:]}
+        for name in ('game', 'game_answer', 'display_words', 'view_study_records', 'upload_csv', 'tts'):
+            self.assertEqual(rows[name][1:3], ['4', '0'])  # 请求数和错误数
+        self.assertFalse(WordGroup.objects.filter(name='bench_upload').exists())
+
+    def test_percentile(self):
+        from .bench import percentile
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 50), percentile(values, 95), percentile(values, 99)), (50, 95, 99))
+
+
+class AsyncViewsTest(TempDirMixin, TestCase):
+    temp_dir_settings = ['TTS_CACHE_DIR']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='asyncuser', password='12345')
+        cls.group = WordGroup.objects.create(name='Async Group')
+        cls.words = Word.objects.bulk_create([Word(word=f'async{i}', meaning='异步', group=cls.group) for i in range(3)])
+        StudyRecord.objects.bulk_create([StudyRecord(user=cls.user, word=w) for w in cls.words * 2])
+
+    async def test_async_game_flow(self):
+        from asgiref.sync import sync_to_async
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        url = reverse('game', args=[self.group.id])
+        response = await client.get(url)
+        word = response.context['word']
+        self.assertIn(word, self.words)
+        response = await client.post(url, {'word_id': word.id, 'guess': word.word})
+        self.assertEqual(response.context['success_message'], '恭喜，猜对了')
+        self.assertEqual(await StudyRecord.objects.filter(user=self.user).acount(), 7)
+
+    async def test_async_keyset_page_matches_sync(self):
+        from asgiref.sync import sync_to_async
+        from .pagination import akeyset_page, keyset_page
+        queryset = StudyRecord.objects.filter(user=self.user)
+        rows, cursor = await akeyset_page(queryset, None, 4)
+        expected = await sync_to_async(keyset_page)(queryset, None, 4)
+        self.assertEqual((rows, cursor), expected)
+        self.assertEqual(len((await akeyset_page(queryset, cursor, 4))[0]), 2)
+
+    def test_records_view_logged_in(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('view_study_records'))
+        self.assertEqual(len(response.context['study_records']), 6)
+
+    @override_settings(TTS_SYNTHESIZER='wordapp.bench.SlowFakeSynthesizer')
+    def test_tts_requests_overlap_under_asgi(self):
+        from .bench import asgi_application, run_asgi_scenario
+        result = asyncio.run(run_asgi_scenario(
+            asgi_application(), 'tts', lambda i: reverse('tts', args=[f'overlap{i}']), [], 16, 8))
+        self.assertEqual((result.requests, result.errors), (16, 0))
+        # 每次合成 0.05 秒，串行执行需要 0.8 秒
+        self.assertLess(result.elapsed, 0.5)
+
+
+class WordSearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group1 = WordGroup.objects.create(name='Search Group 1')
+        cls.group2 = WordGroup.objects.create(name='Search Group 2')
+        Word.objects.bulk_create([
+            Word(word='running', meaning='跑步', group=cls.group1),
+            Word(word='swimming', meaning='游泳', group=cls.group1),
+            Word(word='Ring', meaning='戒指', group=cls.group2),
+            Word(word='apple', meaning='苹果', group=cls.group2),
+            Word(word='application', meaning='应用程序', group=cls.group2),
+        ])
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('search_words'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def words(self, q, **params):
+        return [row['word'] for row in self.search(q, **params)['results']]
+
+    def test_substring_across_groups(self):
+        data = self.search('ING')
+        self.assertEqual(sorted(row['word'] for row in data['results']), ['Ring', 'running', 'swimming'])
+        self.assertEqual({row['group_name'] for row in data['results']}, {'Search Group 1', 'Search Group 2'})
+        self.assertEqual(self.words('应用程'), ['application'])
+
+    def test_index_follows_changes(self):
+        from io import BytesIO
+        from .importer import import_words
+        import_words(BytesIO('Word,Meaning\nbringing,带来\n'.encode()), self.group1)
+        self.assertIn('bringing', self.words('ringi'))
+        word = Word.objects.get(word='swimming')
+        word.word = 'swam'
+        word.save()
+        self.assertEqual(self.words('swim'), [])
+        self.assertEqual(self.words('swa'), ['swam'])
+        Word.objects.filter(word='running').delete()
+        self.assertNotIn('running', self.words('unn'))
+
+    def test_short_query_matches_substring(self):
+        Word.objects.create(word='pear', meaning='n. 梨；苹果梨', group=self.group1)
+        self.assertEqual(self.words('ap'), ['apple', 'application'])
+        self.assertEqual(self.words('游'), ['swimming'])
+        self.assertEqual(self.words('pl'), ['apple', 'application'])
+        # 两个字的中文查询匹配释义中间的部分
+        self.assertEqual(self.words('苹果'), ['apple', 'pear'])
+        self.assertEqual(self.words('%'), [])
+        self.assertEqual(self.words('_'), [])
+        self.group1.deleted_at = timezone.now()
+        self.group1.save()
+        self.assertEqual(self.words('苹果'), ['apple'])
+
+    def test_limit_and_offset(self):
+        data = self.search('ing', limit=2)
+        self.assertEqual(len(data['results']), 2)
+        self.assertTrue(data['has_more'])
+        rest = self.search('ing', limit=2, offset=data['next_offset'])
+        self.assertEqual(len(rest['results']), 1)
+        self.assertFalse(rest['has_more'])
+        self.assertIsNone(rest['next_offset'])
+        self.assertEqual(self.client.get(reverse('search_words'), {'q': 'ing', 'limit': 'x'}).status_code, 400)
+
+    def test_query_syntax_is_literal(self):
+        # 用户输入按短语匹配，不会被解析成 FTS5 语法
+        for q in ['"ing', 'ing OR app', 'NEAR(ing app)', 'ing*', '']:
+            self.assertEqual(self.search(q)['results'], [])
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='exportstaff', password='12345', is_staff=True)
+        cls.user = User.objects.create_user(username='exportuser', password='12345')
+        cls.group = WordGroup.objects.create(name='导出 Group')
+        cls.words = Word.objects.bulk_create([
+            Word(word='comma', meaning='逗号, 标点', group=cls.group),
+            Word(word='quote', meaning='引号 "', group=cls.group),
+            Word(word='line', meaning='换行', group=cls.group),
+        ])
+        StudyRecord.objects.bulk_create([StudyRecord(user=cls.user, word=w) for w in cls.words])
+
+    def download(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_group_round_trip(self):
+        from io import BytesIO
+        from .importer import import_words
+        self.client.force_login(self.staff)
+        response, content = self.download(reverse('export_group_words', args=[self.group.id]))
+        self.assertIn("filename*=utf-8''%E5%AF%BC%E5%87%BA%20Group.csv", response['Content-Disposition'])
+        copy = WordGroup.objects.create(name='Copy')
+        result = import_words(BytesIO(content), copy)
+        self.assertEqual(result.skipped, 0)
+        self.assertEqual(list(copy.word_set.order_by('id').values_list('word', 'meaning')),
+                         [(w.word, w.meaning) for w in self.words])
+
+    def test_group_gzip(self):
+        import gzip
+        self.client.force_login(self.staff)
+        url = reverse('export_group_words', args=[self.group.id])
+        response, content = self.download(url, gzip=1)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(content), self.download(url)[1])
+
+    def test_records_csv_and_ndjson(self):
+        import csv
+        self.client.force_login(self.user)
+        url = reverse('export_study_records')
+        rows = list(csv.reader(StringIO(self.download(url)[1].decode())))
+        self.assertEqual(rows[0], ['timestamp', 'word', 'meaning', 'group'])
+        self.assertEqual([row[1:] for row in rows[1:]], [[w.word, w.meaning, '导出 Group'] for w in self.words])
+        response, content = self.download(url, format='ndjson')
+        records = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([r['word'] for r in records], ['comma', 'quote', 'line'])
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+
+    def test_permissions(self):
+        url = reverse('export_study_records')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, {'user': self.staff.id}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('export_group_words', args=[self.group.id])).status_code, 302)
+        self.client.force_login(self.staff)
+        self.assertEqual(len(self.download(url, user=self.user.id)[1].splitlines()), 4)
+        self.assertEqual(self.client.get(url, {'user': 'x'}).status_code, 404)
+
+    async def test_asgi_streams_async(self):
+        from asgiref.sync import sync_to_async
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.user)
+        response = await client.get(reverse('export_study_records'), {'format': 'ndjson'})
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.splitlines()), 3)
+
+
+@override_settings(JOBS_RETRY_BACKOFF=10, JOBS_MAX_ATTEMPTS=2)
+class JobQueueTest(TestCase):
+    def setUp(self):
+        from .jobs import TASKS, task
+        self.staff = User.objects.create_user(username='jobstaff', password='12345', is_staff=True)
+        self.calls = []
+
+        @task('test_flaky')
+        def flaky(job, fail_times=0):
+            self.calls.append(job.attempts)
+            if len(self.calls) <= fail_times:
+                raise RuntimeError('temporary failure')
+            return {'calls': len(self.calls)}
+
+        self.addCleanup(TASKS.pop, 'test_flaky')
+
+    def test_status_endpoint(self):
+        from .jobs import enqueue
+        job = enqueue('test_flaky', user=self.staff)
+        url = reverse('job_status', args=[job.id])
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).json()['status'], 'queued')
+        run_jobs()
+        data = self.client.get(url).json()
+        self.assertEqual((data['status'], data['progress'], data['result']), ('succeeded', 100, {'calls': 1}))
+        self.client.force_login(User.objects.create_user(username='jobuser', password='12345'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_retry_with_backoff(self):
+        from .jobs import enqueue
+        from .models import Job
+        job = enqueue('test_flaky', {'fail_times': 1})
+        self.assertEqual(run_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('temporary failure', job.error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(run_jobs(), 0)  # 退避期间不会被领取
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        self.assertEqual(run_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), (Job.SUCCEEDED, 2, {'calls': 2}))
+
+    def test_fails_after_max_attempts(self):
+        from .jobs import enqueue
+        from .models import Job
+        job = enqueue('test_flaky', {'fail_times': 5})
+        run_jobs()
+        Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        run_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_expired_lease_is_reclaimed(self):
+        from .jobs import LeaseLost, claim, enqueue, report
+        from .models import Job
+        job = enqueue('test_flaky')
+        first = claim('worker-a')
+        self.assertEqual(first.id, job.id)
+        self.assertIsNone(claim('worker-b'))
+        Job.objects.filter(id=job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        second = claim('worker-b')
+        self.assertEqual((second.locked_by, second.attempts), ('worker-b', 2))
+        with self.assertRaises(LeaseLost):
+            report(first, 50)
+        report(second, 50, 'half')
+        self.assertEqual(Job.objects.get(id=job.id).progress, 50)
+
+    def test_run_worker_command(self):
+        from django.core.management import call_command
+        from .jobs import enqueue
+        enqueue('test_flaky')
+        enqueue('test_flaky')
+        out = StringIO()
+        call_command('run_worker', burst=True, stdout=out)
+        self.assertIn('共执行 2 个任务', out.getvalue())
+
+
+class GroupPurgeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='purgestaff', password='12345', is_staff=True)
+        cls.users = [User.objects.create_user(username=f'purgeuser{i}', password='12345') for i in range(3)]
+        cls.group = WordGroup.objects.create(name='Purge Group')
+        cls.other = WordGroup.objects.create(name='Keep Group')
+        words = Word.objects.bulk_create([Word(word=f'purge{i}', meaning='删除', group=cls.group) for i in range(25)])
+        kept = Word.objects.create(word='purgekeep', meaning='保留', group=cls.other)
+        StudyRecord.objects.bulk_create([StudyRecord(user=u, word=w) for u in cls.users for w in words + [kept]])
+        StudyProgress.objects.bulk_create([StudyProgress(user=u, word_group=g) for u in cls.users
+                                           for g in (cls.group, cls.other)])
+
+    def test_purge_in_batches(self):
+        from .purge import purge_group
+        seen = []
+        with CaptureQueriesContext(connection) as ctx:
+            result = purge_group(self.group.id, batch_size=10, progress=lambda r: seen.append(r.deleted))
+        self.assertEqual((result.records, result.progress, result.words), (75, 3, 25))
+        self.assertEqual(result.total, 103)
+        self.assertEqual(seen[-1], 103)
+        self.assertEqual(seen, sorted(seen))
+        # 8 批学习记录、1 批学习进度、3 批单词
+        self.assertEqual(result.batches, 12)
+        # 不经过级联删除，不会把要删除的行读出来
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(all('COUNT(*)' in sql for sql in selects), selects)
+        self.assertFalse(WordGroup.objects.filter(id=self.group.id).exists())
+        self.assertFalse(Word.objects.filter(group_id=self.group.id).exists())
+        self.assertEqual(StudyRecord.objects.count(), 3)
+        self.assertEqual(StudyProgress.objects.get(user=self.users[0]).word_group, self.other)
+
+    def test_view_hides_then_job_purges(self):
+        from .models import Job
+        self.client.force_login(self.staff)
+        self.client.post(reverse('delete_word_group'), {'group_id': self.group.id})
+        # 任务执行前单词组已经不再显示
+        response = self.client.get(reverse('display_words'))
+        self.assertEqual([g.name for g in response.context['groups']], ['Keep Group'])
+        self.assertEqual(self.client.get(reverse('search_words'), {'q': 'purge'}).json()['results'][0]['word'],
+                         'purgekeep')
+        response = self.client.post(reverse('delete_word_group'), {'group_id': self.group.id})
+        self.assertEqual(Job.objects.count(), 1)  # 重复删除不会再创建任务
+        run_jobs()
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.progress, job.result['words']), (Job.SUCCEEDED, 100, 25))
+        self.assertFalse(WordGroup.objects.filter(id=self.group.id).exists())
+
+    def test_hidden_group_not_playable(self):
+        from .api import make_token
+        from .purge import hide_group
+        words_url = reverse('group_words', args=[self.group.id])
+        self.assertEqual(self.client.get(words_url).status_code, 200)  # 缓存删除前的第一页
+        hide_group(self.group.id)
+        self.assertEqual(self.client.get(words_url).status_code, 404)
+        self.client.force_login(self.users[0])
+        progress = StudyProgress.objects.count()
+        self.assertEqual(self.client.get(reverse('game', args=[self.group.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('session_words', args=[self.group.id])).status_code, 404)
+        word = Word.objects.filter(group=self.group).first()
+        records = StudyRecord.objects.count()
+        response = self.client.post(reverse('session_results', args=[self.group.id]),
+                                    json.dumps({'results': [{'token': make_token(word), 'guess': word.word}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['saved'], 0)
+        self.assertEqual((StudyProgress.objects.count(), StudyRecord.objects.count()), (progress, records))
+
+
+class CounterTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='countuser', password='12345')
+        self.group = WordGroup.objects.create(name='Count Group')
+
+    def import_csv(self, content, **kwargs):
+        from io import BytesIO
+        from .importer import import_words
+        return import_words(BytesIO(content.encode('utf-8')), self.group, **kwargs)
+
+    def test_import_and_delete_maintain_word_count(self):
+        self.import_csv('a,1\nb,2\nc,3')
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.word_count, 3)
+        # 更新已有单词不改变数量，删除文件中没有的单词会减少
+        self.import_csv('a,一\nd,4', delete_missing=True)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.word_count, 2)
+        self.assertEqual(self.group.word_count, Word.objects.filter(group=self.group).count())
+
+    def test_pop_maintains_remaining(self):
+        Word.objects.bulk_create([Word(word=f'c{i}', meaning='m', group=self.group) for i in range(4)])
+        progress = StudyProgress.objects.create(user=self.user, word_group=self.group)
+        progress.reset_progress()
+        self.assertEqual(progress.remaining, 4)
+        progress.pop_word_id()
+        progress.pop_word_ids(2)
+        progress.refresh_from_db()
+        self.assertEqual((progress.learned, progress.remaining), (3, 1))
+        self.assertEqual(progress.progress, 0.75)
+
+    def test_recount_repairs_drift(self):
+        from django.core.management import call_command
+        Word.objects.bulk_create([Word(word=f'd{i}', meaning='m', group=self.group) for i in range(5)])
+        progress = StudyProgress.objects.create(user=self.user, word_group=self.group)
+        progress.reset_progress()
+        StudyProgress.objects.filter(pk=progress.pk).update(remaining=0)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('修正了 1 个单词组和 1 条学习进度', out.getvalue())
+        self.group.refresh_from_db()
+        progress.refresh_from_db()
+        self.assertEqual((self.group.word_count, progress.remaining), (5, 5))
+        out = StringIO()
+        call_command('recount', group=[self.group.id], stdout=out)
+        self.assertIn('修正了 0 个单词组和 0 条学习进度', out.getvalue())
+
+    def test_pages_do_not_count_words(self):
+        self.import_csv('a,1\nb,2')
+        StudyProgress.objects.create(user=self.user, word_group=self.group).reset_progress()
+        self.client.force_login(self.user)
+        for name in ('start_game', 'display_words'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse(name))
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries), name)
+        self.assertContains(response, 'Count Group')
+        response = self.client.get(reverse('start_game'))
+        self.assertContains(response, '（2 个单词）')
+        self.assertContains(response, '本轮已学 0，剩余 2')
@@ -0,0 +1,320 @@
+"""
+TTS 语音缓存
+
+语音文件按 (文本, 发音人, 格式) 的哈希命名，长期保存在 TTS_CACHE_DIR 中，
+超过条目数或总大小上限时按最近最少使用 (LRU) 淘汰。
+同一个单词同时被多次请求时只会合成一次。
+"""
+import asyncio
+import hashlib
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+import edge_tts
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import metrics, perf
+
+DEFAULT_VOICE = 'en-GB-SoniaNeural'
+DEFAULT_FORMAT = 'mp3'
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+class EdgeTTSSynthesizer:
+    """
+    使用 edge-tts 在线合成语音
+    """
+
+    async def synthesize(self, text, voice, path):
+        communicate = edge_tts.Communicate(text, voice)
+        await communicate.save(path)
+
+
+class FakeSynthesizer:
+    """
+    本地假合成器，不访问网络，用于测试
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    async def synthesize(self, text, voice, path):
+        self.calls.append(text)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        with open(path, 'wb') as f:
+            f.write(f'{voice}:{text}'.encode('utf-8'))
+
+
+class AudioCache:
+    def __init__(self, directory, synthesizer, voice=DEFAULT_VOICE, fmt=DEFAULT_FORMAT,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = str(directory)
+        self.synthesizer = synthesizer
+        self.voice = voice
+        self.format = fmt
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0  # 等待其他请求正在进行的合成，既不算命中也不算未命中
+        self.evictions = 0
+        self.failures = 0
+        self._entries = OrderedDict()  # 文件名 -> 字节数，最久未使用的在前
+        self._total_bytes = 0
+        self._inflight = {}  # 文件名 -> 正在进行的合成
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        # 启动时按修改时间恢复 LRU 顺序，并清理上次中断留下的临时文件
+        found = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.tmp'):
+                os.remove(entry.path)
+            elif entry.name.endswith('.' + self.format):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def filename(self, text, voice=None):
+        voice = voice or self.voice
+        digest = hashlib.sha256(f'{self.format}\0{voice}\0{text}'.encode('utf-8')).hexdigest()
+        return f'{digest}.{self.format}'
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def lookup(self, text, voice=None):
+        """
+        返回已缓存文件的路径，没有缓存时返回 None
+        """
+        name = self.filename(text, voice)
+        path = self.path(name)
+        with self._lock:
+            known = name in self._entries
+            if known:
+                self._entries.move_to_end(name)
+        if not known:
+            # 可能是其他进程写入的文件
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return None
+            self._add(name, size)
+            return path
+        try:
+            os.utime(path)  # 记录访问时间，重启后 LRU 顺序不丢失
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(name)
+            return None
+        return path
+
+    async def get(self, text, voice=None):
+        """
+        返回 text 对应语音文件的路径，没有缓存时合成
+        """
+        voice = voice or self.voice
+        path = self.lookup(text, voice)
+        if path is not None:
+            self.hits += 1
+            metrics.TTS_CACHE.inc('hit')
+            return path
+
+        name = self.filename(text, voice)
+        with self._lock:
+            pending = self._inflight.get(name)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[name] = Future()
+        if not leader:
+            # 同一个词已经在合成，等待它完成即可
+            self.waits += 1
+            metrics.TTS_CACHE.inc('wait')
+            return await asyncio.wrap_future(pending)
+
+        self.misses += 1
+        metrics.TTS_CACHE.inc('miss')
+        try:
+            path = await self._synthesize(name, text, voice)
+        except BaseException as e:
+            self.failures += 1
+            metrics.TTS_FAILURES.inc()
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set_result(path)
+            return path
+        finally:
+            with self._lock:
+                del self._inflight[name]
+
+    async def _synthesize(self, name, text, voice):
+        # 先写临时文件再原子重命名，其他请求不会读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            start = time.perf_counter()
+            with perf.timed('tts'):
+                await self.synthesizer.synthesize(text, voice, tmp_path)
+            metrics.TTS_SYNTHESIS.observe(time.perf_counter() - start)
+            path = self.path(name)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._add(name, os.path.getsize(path))
+        return path
+
+    def _add(self, name, size):
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = size
+            self._total_bytes += size
+            victims = []
+            while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                victim, victim_size = self._entries.popitem(last=False)
+                self._total_bytes -= victim_size
+                victims.append(victim)
+            self.evictions += len(victims)
+        for victim in victims:
+            try:
+                os.remove(self.path(victim))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, name):
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            total_bytes = self._total_bytes
+        requests = self.hits + self.misses + self.waits
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'waits': self.waits,
+            'hit_ratio': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'failures': self.failures,
+            'entries': entries,
+            'bytes': total_bytes,
+        }
+
+
+@dataclass
+class WarmResult:
+    total: int = 0
+    cached: int = 0
+    synthesized: int = 0
+    failed: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def done(self):
+        return self.cached + self.synthesized + len(self.failed)
+
+    @property
+    def per_second(self):
+        return self.synthesized / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f'共 {self.total} 个单词：已缓存 {self.cached}，新合成 {self.synthesized}，'
+                f'失败 {len(self.failed)}，用时 {self.elapsed:.1f} 秒（{self.per_second:.1f} 个/秒）')
+
+
+async def warm(cache, texts, concurrency=4, retries=3, backoff=0.5, progress=None):
+    """
+    为 texts 中尚未缓存的单词预先合成语音，返回 WarmResult
+
+    最多同时合成 concurrency 个，失败后按指数退避重试 retries 次；
+    progress 是可选的回调，每处理完一个单词调用一次 progress(result)
+    """
+    result = WarmResult()
+    start = time.perf_counter()
+    missing = []
+    for text in dict.fromkeys(texts):  # 去重并保持顺序
+        result.total += 1
+        if cache.lookup(text) is not None:
+            result.cached += 1
+        else:
+            missing.append(text)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def report():
+        result.elapsed = time.perf_counter() - start
+        if progress is not None:
+            progress(result)
+
+    async def synthesize(text):
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    await cache.get(text)
+                except Exception as e:
+                    if attempt == retries:
+                        result.failed.append((text, str(e)))
+                        break
+                    # 指数退避并加入随机抖动，避免同时重试
+                    await asyncio.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+                else:
+                    result.synthesized += 1
+                    break
+        report()
+
+    await asyncio.gather(*(synthesize(text) for text in missing))
+    report()
+    return result
+
+
+_audio_cache = None
+_audio_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """
+    返回按 settings 配置的全局语音缓存
+    """
+    global _audio_cache
+    with _audio_cache_lock:
+        if _audio_cache is None:
+            synthesizer_class = import_string(getattr(
+                settings, 'TTS_SYNTHESIZER', 'wordapp.tts_cache.EdgeTTSSynthesizer'))
+            _audio_cache = AudioCache(
+                settings.TTS_CACHE_DIR,
+                synthesizer_class(),
+                voice=getattr(settings, 'TTS_VOICE', DEFAULT_VOICE),
+                max_entries=getattr(settings, 'TTS_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                max_bytes=getattr(settings, 'TTS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+            )
+        return _audio_cache
+
+
+@receiver(setting_changed)
+def reset_audio_cache(setting=None, **kwargs):
+    global _audio_cache
+    if setting is None or setting.startswith('TTS_'):
+        with _audio_cache_lock:
+            _audio_cache = None
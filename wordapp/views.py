@@ -1,24 +1,43 @@
-from collections import deque
-from datetime import timedelta
-import csv
+import json
+import logging
 import os
-from io import TextIOWrapper
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login as auth_login
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponse
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
-from django.utils import timezone
+from django.urls import reverse
 
+from .achievements import get_stats
+from .activity import heatmap
+from .audio import serve_audio
+from .caching import group_cache_key
+from .exports import FORMATS, export_group, export_records, streaming_response
 from .forms import UploadCSVForm, WordGroupForm
-from .models import Word, WordGroup, StudyRecord, StudyProgress, Achievement, UserAchievement
-import edge_tts
-import random
-
-
+from .jobs import enqueue, save_upload
+from .metrics import REGISTRY
+from .models import Job, Word, WordGroup, StudyRecord, StudyProgress, UserAchievement
+from .pagination import akeyset_page
+from .purge import hide_group
+from .search import MAX_LIMIT, search_words
+from .sampling import get_recent, sample_word, set_recent
+from .tts_cache import get_audio_cache
+from .writebehind import ensure_flushed, save_study_records
+import re
+
+logger = logging.getLogger(__name__)
+
+AUDIO_NAME_RE = re.compile(r'[0-9a-f]{64}\.\w+')
+STUDY_RECORDS_PAGE_SIZE = 50
+GROUP_WORDS_PAGE_SIZE = 100
+GROUP_WORDS_CACHE_TIMEOUT = 60 * 60
+RECENT_JOBS = 10
 
 
 def index(request):
@@ -36,41 +55,127 @@ def upload_csv(request):
                 return redirect('upload_csv')
 
             group_name = csv_file.name.replace('.csv', '')  # 使用文件名作为单词组名
-            group, created = WordGroup.objects.get_or_create(name=group_name)
-
-            # 使用 TextIOWrapper 将文件转换为文本文件
-            csv_text = TextIOWrapper(csv_file.file, encoding='utf-8')
-            reader = csv.reader(csv_text)
-            for row in reader:
-                word, meaning = row
-                Word.objects.create(word=word, meaning=meaning, group=group)
-
-            messages.success(request, 'CSV 文件上传成功.')
+            group, created = WordGroup.objects.visible().get_or_create(name=group_name)
+
+            # 由后台任务分块写入，已有的单词更新释义，格式错误的行会被跳过
+            job = enqueue('import_words', {
+                'path': save_upload(csv_file),
+                'group_id': group.id,
+                'delete_missing': form.cleaned_data['delete_missing'],
+            }, user=request.user)
+            messages.success(request, f'CSV 文件上传成功，正在后台导入（任务 #{job.id}）')
             return redirect('upload_csv')
     else:
         form = UploadCSVForm()
 
-    groups = WordGroup.objects.all()
-    return render(request, 'wordapp/upload_csv.html', {'form': form, 'groups': groups})
+    groups = WordGroup.objects.visible()
+    jobs = Job.objects.order_by('-id')[:RECENT_JOBS]
+    return render(request, 'wordapp/upload_csv.html', {'form': form, 'groups': groups, 'jobs': jobs})
 
 
 @staff_member_required#需要管理员权限
-def delete_word_group(request, group_id):
+def delete_word_group(request):
     if request.method == 'POST':
-        Word.objects.filter(group_id=group_id).delete()
-        WordGroup.objects.filter(id=group_id).delete()
-        messages.success(request, '单词组删除成功')
+        group_id = request.POST.get('group_id', '')
+        # 先隐藏单词组，页面上立即消失，再由后台任务分批删除
+        if not group_id.isdigit() or not hide_group(int(group_id)):
+            messages.error(request, '单词组不存在')
+            return redirect('upload_csv')
+        job = enqueue('delete_word_group', {'group_id': int(group_id)}, user=request.user)
+        messages.success(request, f'正在后台删除单词组（任务 #{job.id}）')
         return redirect('upload_csv')
     return redirect('upload_csv')
 
 
+@staff_member_required
+def job_status(request, job_id):
+    # 后台任务的状态，上传页面轮询显示进度
+    job = get_object_or_404(Job, id=job_id)
+    return JsonResponse({
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'finished': job.finished,
+        'progress': job.progress,
+        'message': job.message,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'attempts': job.attempts,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
 def display_words(request):
-    groups = WordGroup.objects.all()  # 获取所有单词分组
-    words_by_group = {}
-    for group in groups:
-        # 获取每个分组下的单词列表，ord.objects.filter(group=group) 使用Word模型的objects管理器的filter方法过滤group字段等于当前循环的group的值
-        words_by_group[group] = Word.objects.filter(group=group)
-    return render(request, 'wordapp/display_words.html', {'words_by_group': words_by_group})
+    # 单词数量保存在 word_count 中，不需要对单词表计数；单词列表在展开时通过 group_words 加载
+    groups = WordGroup.objects.visible().order_by('id')
+    return render(request, 'wordapp/display_words.html', {'groups': groups})
+
+
+def group_words(request, group_id):
+    # 分页返回单词组中的单词，渲染好的结果按单词组版本号缓存
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    key = group_cache_key(group_id, 'words', page)
+    content = cache.get(key)
+    if content is None:
+        # 删除单词组时会更新版本号，只需在缓存未命中时确认单词组没有被删除
+        if not WordGroup.objects.visible().filter(id=group_id).exists():
+            raise Http404('单词组不存在')
+        offset = (page - 1) * GROUP_WORDS_PAGE_SIZE
+        words = list(Word.objects.filter(group_id=group_id).order_by('id')
+                     .values('word', 'meaning')[offset:offset + GROUP_WORDS_PAGE_SIZE + 1])
+        has_next = len(words) > GROUP_WORDS_PAGE_SIZE
+        content = json.dumps({
+            'group': group_id,
+            'page': page,
+            'next_page': page + 1 if has_next else None,
+            'words': words[:GROUP_WORDS_PAGE_SIZE],
+        }, ensure_ascii=False)
+        cache.set(key, content, GROUP_WORDS_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type='application/json')
+
+
+@staff_member_required
+def export_group_words(request, group_id):
+    # 导出单词组，可以直接作为 CSV 重新上传
+    group = get_object_or_404(WordGroup.objects.visible(), id=group_id)
+    return streaming_response(request, export_group(group), f'{group.name}.csv', FORMATS['csv'],
+                              gzip='gzip' in request.GET)
+
+
+def export_study_records(request):
+    # 导出自己的学习记录，管理员可以用 ?user= 导出任意用户的记录
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': '请先登录'}, status=403)
+    user_id = request.user.id
+    if request.GET.get('user'):
+        if not request.user.is_staff:
+            return JsonResponse({'status': 'error', 'message': '没有权限'}, status=403)
+        if not request.GET['user'].isdigit():
+            raise Http404
+        user_id = get_object_or_404(User, id=request.GET['user']).id
+    format = request.GET.get('format', 'csv')
+    if format not in FORMATS:
+        return JsonResponse({'status': 'error', 'message': '不支持的格式'}, status=400)
+    ensure_flushed(user_id)
+    return streaming_response(request, export_records(user_id, format), f'study_records_{user_id}.{format}',
+                              FORMATS[format], gzip='gzip' in request.GET)
+
+
+def search(request):
+    # 跨单词组搜索单词，用于输入时的自动补全
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_LIMIT)
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': '参数错误'}, status=400)
+    results, has_more = search_words(request.GET.get('q', ''), limit, offset)
+    return JsonResponse({
+        'results': results,
+        'has_more': has_more,
+        'next_offset': offset + limit if has_more else None,
+    }, json_dumps_params={'ensure_ascii': False})
 
 
 def start_game(request):
@@ -81,30 +186,50 @@ def start_game(request):
             return redirect('game', group_id=selected_group.id)
     else:
         form = WordGroupForm()
-    groups = WordGroup.objects.all()
+    groups = list(WordGroup.objects.visible().order_by('id'))
+    if request.user.is_authenticated:
+        # 学习进度只读取计数，不读取 queue
+        progress = {p.word_group_id: p for p in StudyProgress.objects.filter(
+            user=request.user, word_group__in=groups).defer('queue')}
+        for group in groups:
+            group.study_progress = progress.get(group.id)
     return render(request, 'wordapp/start_game.html', {'form': form, 'groups': groups})
 
 
-def game(request, group_id):
+async def aget_user(request):
+    # Django 4.2 还没有 request.auser()，在线程中解析出 request.user，之后可以直接使用
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+async def game(request, group_id):
+    user = await aget_user(request)
+    # 先确认单词组存在且没有被删除，否则创建学习进度时会违反外键约束
+    if not await WordGroup.objects.visible().filter(id=group_id).aexists():
+        raise Http404('单词组不存在')
+    # 未登录用户最近出现过的单词，避免连续重复
+    recent = [] if user.is_authenticated else get_recent(request, group_id)
     if request.method == 'POST':
         last_guess = request.POST.get('guess', '')
         word_id = request.POST.get('word_id')
         guessed_word = request.POST.get('guess')
-        word = get_object_or_404(Word, pk=word_id)
+        try:
+            word = await Word.objects.aget(pk=word_id)
+        except (Word.DoesNotExist, ValueError):
+            raise Http404('单词不存在')
 
         if all(g == a for g, a in zip(guessed_word, word.word)):
-            if request.user.is_authenticated:
-                study_record = StudyRecord(user=request.user, word=word)
-                study_record.save()
+            if user.is_authenticated:
+                await sync_to_async(save_study_records)(user, [word])
 
-            word = get_next_word(request.user, group_id)
+            word = await get_next_word(user, group_id, recent)
 
             context = {
                 'word': word,
                 'success_message': '恭喜，猜对了',
                 'last_guess': ""
             }
-            return render(request, 'wordapp/game.html', context)
+            response = render(request, 'wordapp/game.html', context)
         else:
             feedback = get_feedback(word.word, guessed_word)
             combined_list = zip(feedback, guessed_word)
@@ -118,34 +243,25 @@ def game(request, group_id):
             }
             return render(request, 'wordapp/game.html', context)
     else:
-        word = get_next_word(request.user, group_id)
+        word = await get_next_word(user, group_id, recent)
 
         context = {
             'word': word,
         }
-        return render(request, 'wordapp/game.html', context)
-
-
-def get_next_word(user, group_id):
-    words = Word.objects.filter(group_id=group_id)
-    if words.exists():
-        if user.is_authenticated:
-            study_progress, created = StudyProgress.objects.get_or_create(
-                user=user, word_group_id=group_id)
-            if created:
-                study_progress.reset_progress()
-            if study_progress.words_to_learn.exists():
-                word = random.choice(study_progress.words_to_learn.all())
-                study_progress.remove_word(word)
-            else:
-                study_progress.reset_progress()
-                word = random.choice(
-                    study_progress.words_to_learn.all())  # 随机选取没学的单词
-        else:
-            word = random.choice(words)
-        return word
-    else:
-        return None
+        response = render(request, 'wordapp/game.html', context)
+    if not user.is_authenticated:
+        set_recent(response, group_id, recent, word)
+    return response
+
+
+async def get_next_word(user, group_id, recent=()):
+    if user.is_authenticated:
+        study_progress, created = await StudyProgress.objects.aget_or_create(
+            user=user, word_group_id=group_id)
+        if created:
+            await sync_to_async(study_progress.reset_progress)()
+        return await study_progress.anext_word()  # 按打乱后的顺序取没学的单词
+    return await sync_to_async(sample_word)(group_id, recent)
 
 
 def get_feedback(actual_word, guessed_word):
@@ -163,36 +279,37 @@ def get_feedback(actual_word, guessed_word):
 
 
 async def tts(request, word):  # 异步
-    if not os.path.exists('wordapp/tts'):
-        os.makedirs('wordapp/tts')
-    delete_files_in_folder('wordapp/tts')
-    text = word
-    voice = "en-GB-SoniaNeural"
-    output_file = f"wordapp/tts/{word}.mp3"
+    cache = get_audio_cache()
+    try:
+        output_file = await cache.get(word)
+    except Exception as e:
+        logger.warning('TTS synthesis failed for %r: %s', word, e)
+        return JsonResponse({'status': 'error'}, status=502)
+
+    filename = os.path.basename(output_file)
+    return JsonResponse({'status': 'success', 'filename': filename,
+                         'url': reverse('play_audio', args=[filename])})
 
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_file)
 
-    return JsonResponse({'status': 'success', 'filename': output_file})
+@staff_member_required
+def tts_stats(request):
+    return JsonResponse(get_audio_cache().stats())
 
 
-def delete_files_in_folder(folder_path):
-    for filename in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, filename)
-        try:
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Error deleting file: {e}")
+def metrics(request):
+    # 供 Prometheus 抓取，只允许管理员或 METRICS_ALLOWED_IPS 中的地址访问
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not request.user.is_staff and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponse(status=403)
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
-def play_audio(request, file_path):
-    # 构造音频文件的完整路径
-    audio_file = file_path
-    # 以二进制形式打开音频文件
-    with open(audio_file, 'rb') as f:
-        response = HttpResponse(f.read(), content_type="audio/mp3")
-        return response
+def play_audio(request, name):
+    # 只允许访问语音缓存目录中的文件
+    cache = get_audio_cache()
+    if not AUDIO_NAME_RE.fullmatch(name) or not name.endswith('.' + cache.format):
+        raise Http404('音频文件不存在')
+    return serve_audio(request, cache.path(name))
 
 
 def login(request):
@@ -218,91 +335,48 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
-def view_study_records(request):
-    # 如果用户已登录，则查询该用户的学习记录并按时间排序
-    if request.user.is_authenticated:
-        current_user = request.user
-        study_records = StudyRecord.objects.filter(
-            user=current_user).order_by('-timestamp')
-        total_records = study_records.count()
-
-        # 检查并添加成就
-        user_id = current_user.id
-        add_achievements(user_id)
-
-        # 获取用户的成就
-        user_achievements = UserAchievement.objects.filter(user=current_user)
-
-        return render(request, 'wordapp/view_study_records.html', {'study_records': study_records, 'total_records': total_records, 'user_achievements': user_achievements})
+async def view_study_records(request):
+    # 如果用户已登录，则分页查询该用户的学习记录并按时间倒序排列
+    current_user = await aget_user(request)
+    if current_user.is_authenticated:
+        await sync_to_async(ensure_flushed)(current_user.id)
+        study_records, next_cursor = await akeyset_page(
+            StudyRecord.objects.filter(user=current_user).select_related('word'),
+            request.GET.get('before'), STUDY_RECORDS_PAGE_SIZE)
+        stats, _ = await sync_to_async(get_stats)(current_user.id)
+        total_records = stats.total_records
+
+        # 获取用户的成就，成就在写入学习记录时就已发放，这里只需读取
+        user_achievements = [user_achievement async for user_achievement in UserAchievement.objects.filter(
+            user=current_user).select_related('achievement')]
+
+        return render(request, 'wordapp/view_study_records.html', {
+            'study_records': study_records, 'next_cursor': next_cursor,
+            'total_records': total_records, 'user_achievements': user_achievements})
     else:
         # 如果用户未登录，重定向到登录页面
         return redirect(f'/login/?next={request.path}')
 
 
-def add_achievements(user_id):
-    user = User.objects.get(pk=user_id)
-    study_records = StudyRecord.objects.filter(
-        user=user).order_by('-timestamp')
-    total_records = study_records.count()
-
-    achievements = [
-        ("千里之行", 1),
-        ("拾级而上", 10),
-        ("积少成多", 100),
-        ("词汇大师", 500),
-        ("学富五车", 1000),
-    ]
-    for achievement_name, threshold in achievements:
-        if total_records >= threshold and not UserAchievement.objects.filter(user=user, achievement__name=achievement_name).exists():
-            achievement = Achievement.objects.create(name=achievement_name, description=f"学习{threshold}个单词")
-            UserAchievement.objects.create(user=user, achievement=achievement)
-
-        
-    # 心如明镜
-    if check_consecutive_days(study_records, 30):
-        if not UserAchievement.objects.filter(user=user, achievement__name="心如明镜").exists():
-            achievement = Achievement.objects.create(
-                name="心如明镜", description="连续学习30天")
-            UserAchievement.objects.create(user=user, achievement=achievement)
-
-    # 清风明月
-    if check_consecutive_days(study_records, 60):
-        if not UserAchievement.objects.filter(user=user, achievement__name="清风明月").exists():
-            achievement = Achievement.objects.create(
-                name="清风明月", description="连续学习60天")
-            UserAchievement.objects.create(user=user, achievement=achievement)
-
-    # 博闻强识
-    if check_words_in_week(study_records, 50):
-        if not UserAchievement.objects.filter(user=user, achievement__name="博闻强识").exists():
-            achievement = Achievement.objects.create(
-                name="博闻强识", description="在一周内学50个单词")
-            UserAchievement.objects.create(user=user, achievement=achievement)
-
-
-def check_consecutive_days(study_records, days):
-    #计算连续学习天数 
-    today = timezone.now().date()
-    start_date = today - timedelta(days=days-1)
-    dates = deque()  # 使用 deque 来存储最近的连续日期
-    for record in study_records:
-        if record.timestamp.date() >= start_date and record.timestamp.date() <= today:
-            # 如果学习记录在开始日期到今天之间
-            if record.timestamp.date() not in dates:
-                dates.append(record.timestamp.date())
-                if len(dates) >= days:  # 如果 dates 中的日期数量大于 days
-                    return len(dates)
-        else:
-            dates.clear()  # 如果记录日期不在指定范围内，则清空 dates，重新开始计数
-    return len(dates)  
-
-def check_words_in_week(study_records, count):
-    today = timezone.now().date()
-    start_date = today - timedelta(days=7)
-    words_in_week = 0
-    for record in study_records:
-        if record.timestamp.date() >= start_date and record.timestamp.date() <= today:
-            words_in_week += 1
-            if words_in_week >= count:
-                return True
-    return False
+async def study_records_json(request):
+    # 学习记录的 JSON 版本，供无限滚动使用
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': '请先登录'}, status=403)
+    await sync_to_async(ensure_flushed)(user.id)
+    study_records, next_cursor = await akeyset_page(
+        StudyRecord.objects.filter(user=user).select_related('word'),
+        request.GET.get('before'), STUDY_RECORDS_PAGE_SIZE)
+    return JsonResponse({
+        'records': [{'id': record.id, 'word': record.word.word, 'meaning': record.word.meaning,
+                     'timestamp': record.timestamp.isoformat()} for record in study_records],
+        'next': next_cursor,
+    })
+
+
+def activity_heatmap(request):
+    # 最近一年每天的学习数量和连续学习天数
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': '请先登录'}, status=403)
+    ensure_flushed(request.user.id)
+    return JsonResponse(heatmap(request.user.id))
@@ -0,0 +1,273 @@
+"""
+学习记录的延迟写入 (write-behind)
+
+开启 STUDY_RECORD_WRITE_BEHIND 后，学习记录先放进进程内的缓冲区，
+由后台线程每隔 STUDY_RECORD_WRITE_BEHIND_MAX_LAG 秒批量写入一次，
+避免上课时大量学生同时答题争抢 SQLite 的写锁。
+
+配置了 STUDY_RECORD_WRITE_BEHIND_SPOOL 目录时，缓冲区中的记录会同时追加到
+该目录下的文件里，进程异常退出后由下一个启动的进程补写。
+进程正常退出时会自动写入剩余的记录。读取用户自己的记录前调用 ensure_flushed。
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.signals import setting_changed
+from django.db import IntegrityError, close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import StudyRecord, Word
+from .signals import study_records_created
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_LAG = 1.0
+DEFAULT_BATCH_SIZE = 500
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindBuffer:
+    def __init__(self, max_lag=DEFAULT_MAX_LAG, batch_size=DEFAULT_BATCH_SIZE, spool_dir=None):
+        self.max_lag = max_lag
+        self.batch_size = batch_size
+        self.spool_dir = spool_dir
+        self.flushed = 0
+        self._pending = []  # [(user_id, word_id, timestamp), ...]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._spool = None
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+            self._spool = open(self._spool_path(), 'a', encoding='utf-8')
+            self._recover()
+
+    def _spool_path(self):
+        return os.path.join(self.spool_dir, f'{os.getpid()}.spool')
+
+    def _recover(self):
+        # 接管已退出进程留下的 spool 文件，记录转入本进程的缓冲区和 spool
+        for name in os.listdir(self.spool_dir):
+            stem, ext = os.path.splitext(name)
+            if ext != '.spool' or not stem.isdigit() or int(stem) == os.getpid() or pid_alive(int(stem)):
+                continue
+            claimed = os.path.join(self.spool_dir, f'{os.getpid()}-{stem}.recovering')
+            try:
+                os.rename(os.path.join(self.spool_dir, name), claimed)
+            except FileNotFoundError:
+                continue  # 被其他进程抢先接管
+            events = []
+            with open(claimed, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                        events.append((event['u'], event['w'], parse_datetime(event['t'])))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning('Skipping corrupt spool line in %s', claimed)
+            self._append(events)
+            os.remove(claimed)
+            logger.info('Recovered %d buffered study records from %s', len(events), name)
+
+    def add(self, user_id, word_ids, timestamp=None):
+        timestamp = timestamp or timezone.now()
+        self._append([(user_id, word_id, timestamp) for word_id in word_ids])
+
+    def _append(self, events):
+        with self._lock:
+            self._pending.extend(events)
+            if self._spool is not None:
+                self._spool.write(''.join(
+                    json.dumps({'u': u, 'w': w, 't': t.isoformat()}) + '\n' for u, w, t in events))
+                self._spool.flush()
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def has_pending(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                return bool(self._pending)
+            return any(event[0] == user_id for event in self._pending)
+
+    def flush(self):
+        """
+        把缓冲区中的记录写入数据库，返回写入的条数
+
+        单词或用户在写入前已被删除的记录直接丢弃；数据库暂时不可用等其他错误时，
+        还没写入的记录放回缓冲区，下次重试
+        """
+        with self._flush_lock:
+            with self._lock:
+                events = self._pending
+                self._pending = []
+            if not events:
+                return 0
+            records = []
+            done = 0  # 已经写入或丢弃的记录数，批次按顺序处理
+            try:
+                events = self._drop_orphans(events)
+                for written, count in self._batches(events):
+                    records += written
+                    done += count
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = events[done:]  # 放回缓冲区，下次重试
+                self._rewrite_spool()
+                self.flushed += len(records)
+                raise
+            self._rewrite_spool()
+            self.flushed += len(records)
+        study_records_created(records)
+        return len(records)
+
+    def _drop_orphans(self, events):
+        word_ids = set(Word.objects.filter(id__in={w for u, w, t in events}).values_list('id', flat=True))
+        user_ids = set(User.objects.filter(id__in={u for u, w, t in events}).values_list('id', flat=True))
+        kept = [event for event in events if event[1] in word_ids and event[0] in user_ids]
+        if len(kept) < len(events):
+            logger.warning('Dropping %d buffered study records of deleted words or users', len(events) - len(kept))
+        return kept
+
+    def _batches(self, events):
+        """
+        在事务中写入 events，依次产出 (写入的记录, 处理的记录数)；违反约束时对半拆分重试，最终只丢弃出错的单条记录
+        """
+        try:
+            with transaction.atomic():
+                records = StudyRecord.objects.bulk_create(
+                    [StudyRecord(user_id=u, word_id=w) for u, w, t in events])
+                # auto_now_add 会把时间改成写入时间，这里改回答题时间
+                for record, (u, w, t) in zip(records, events):
+                    record.timestamp = t
+                StudyRecord.objects.bulk_update(records, ['timestamp'])
+        except IntegrityError:
+            if len(events) == 1:
+                logger.warning('Dropping buffered study record %r that cannot be written', events[0], exc_info=True)
+                yield [], 1
+                return
+            middle = len(events) // 2
+            yield from self._batches(events[:middle])
+            yield from self._batches(events[middle:])
+            return
+        yield records, len(events)
+
+    def _rewrite_spool(self):
+        # spool 中只保留还没写入数据库的记录
+        if self._spool is None:
+            return
+        with self._lock:
+            path = self._spool_path()
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for u, w, t in self._pending:
+                    f.write(json.dumps({'u': u, 'w': w, 't': t.isoformat()}) + '\n')
+            self._spool.close()
+            os.replace(tmp_path, path)
+            self._spool = open(path, 'a', encoding='utf-8')
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='study-record-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.max_lag)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered study records failed')
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """
+        停止后台线程并写入剩余的记录
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def is_enabled():
+    return getattr(settings, 'STUDY_RECORD_WRITE_BEHIND', False)
+
+
+def get_buffer(start=True):
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer(
+                max_lag=getattr(settings, 'STUDY_RECORD_WRITE_BEHIND_MAX_LAG', DEFAULT_MAX_LAG),
+                batch_size=getattr(settings, 'STUDY_RECORD_WRITE_BEHIND_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                spool_dir=getattr(settings, 'STUDY_RECORD_WRITE_BEHIND_SPOOL', None),
+            )
+            atexit.register(_buffer.stop)
+        if start:
+            _buffer.start()
+        return _buffer
+
+
+def save_study_records(user, words):
+    """
+    为 user 写入学过的 words；开启 write-behind 时只放进缓冲区
+    """
+    if not words:
+        return
+    if is_enabled():
+        get_buffer().add(user.id, [word.id for word in words])
+        return
+    records = StudyRecord.objects.bulk_create([StudyRecord(user=user, word=word) for word in words])
+    study_records_created(records)
+
+
+def ensure_flushed(user_id):
+    """
+    读取用户自己的记录前调用，保证能读到刚写入的记录；写入失败时只记录日志，不影响页面
+    """
+    if _buffer is not None and _buffer.has_pending(user_id):
+        try:
+            _buffer.flush()
+        except Exception:
+            # 写入失败时记录留在缓冲区，页面先显示已经写入的部分
+            logger.exception('Flushing buffered study records for user %s failed', user_id)
+
+
+@receiver(setting_changed)
+def reset_buffer(setting=None, **kwargs):
+    global _buffer
+    if setting is None or setting.startswith('STUDY_RECORD_WRITE_BEHIND'):
+        with _buffer_lock:
+            if _buffer is not None:
+                atexit.unregister(_buffer.stop)
+                _buffer.stop()
+            _buffer = None